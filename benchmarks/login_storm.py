@@ -0,0 +1,88 @@
+"""Login storm against a running instance.
+
+Fires ``--logins`` concurrent ``POST /auth/token`` requests while probing
+an unrelated route, then reports login throughput and the latency of the
+probe route during the storm.
+
+    $ python benchmarks/login_storm.py --email admin@example.com \\
+        --password secret --logins 500 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def login_worker(client, queue, args, results):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        response = await client.post(
+            '/auth/token',
+            data={'username': args.email, 'password': args.password},
+        )
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+
+
+async def probe_worker(client, path, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=60
+    ) as client:
+        queue = asyncio.Queue()
+        for _ in range(args.logins):
+            queue.put_nowait(None)
+
+        results, latencies, stop = {}, [], asyncio.Event()
+        probe = asyncio.create_task(
+            probe_worker(client, args.probe, stop, latencies)
+        )
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                login_worker(client, queue, args, results)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await probe
+
+    print(f'logins: {args.logins} in {elapsed:.2f}s')
+    print(f'throughput: {args.logins / elapsed:.1f} req/s')
+    print(f'status codes: {results}')
+    print(f'probe {args.probe}: {len(latencies)} requests')
+    print(f'  p50: {statistics.median(latencies) * 1000:.1f} ms')
+    print(f'  p99: {percentile(latencies, 99) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--probe', default='/')
+    asyncio.run(main(parser.parse_args()))
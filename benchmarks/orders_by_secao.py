@@ -0,0 +1,110 @@
+"""Compare the product_secao filter as JOIN vs EXISTS on list_orders.
+
+Seeds synthetic orders into the database at DATABASE_URL (use a
+throwaway database) and times both query shapes with EXPLAIN ANALYZE.
+
+    $ python -m benchmarks.orders_by_secao --seed --order-lines 1000000
+"""
+
+import argparse
+import re
+
+from sqlalchemy import select, text
+
+from fast_zero.database import engine
+from fast_zero.models import Order, OrderProduct, Product, table_registry
+from fast_zero.routers.orders import filter_orders
+
+SEED = """
+INSERT INTO clients (nome_completo, cpf, email)
+SELECT 'client ' || g, lpad(g::text, 11, '0'), 'client' || g || '@bench.com'
+FROM generate_series(1, :clients) g;
+
+INSERT INTO products (descricao, valor, codigo_barras, secao, categoria,
+                      estoque_inicial)
+SELECT 'product ' || g, (random() * 1000)::numeric(10, 2), g::text,
+       'secao ' || (g % :secoes), 'books', (random() * 100)::int
+FROM generate_series(1, :products) g;
+
+INSERT INTO orders (state, client_id, created_at)
+SELECT 'paid', 1 + (g % :clients),
+       now() - (g % 365) * interval '1 day'
+FROM generate_series(1, :orders) g;
+
+INSERT INTO order_products (order_id, product_id)
+SELECT DISTINCT 1 + (g % :orders), 1 + ((g * 7919) % :products)
+FROM generate_series(1, :order_lines) g
+ON CONFLICT DO NOTHING;
+
+ANALYZE;
+"""
+
+
+def join_query(secao):
+    return (
+        select(Order)
+        .join(OrderProduct, OrderProduct.order_id == Order.id)
+        .join(Product, Product.id == OrderProduct.product_id)
+        .filter(Product.secao == secao)
+    )
+
+
+def explain_analyze(connection, query):
+    compiled = query.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(
+        f'EXPLAIN (ANALYZE, BUFFERS) {compiled}', compiled.params
+    ).scalars()
+    plan = '\n'.join(plan)
+    return float(re.search(r'Execution Time: ([\d.]+) ms', plan)[1]), plan
+
+
+def main(args):
+    if args.seed:
+        table_registry.metadata.create_all(engine)
+        orders = max(args.order_lines // 3, 1)
+        with engine.begin() as connection:
+            for statement in filter(None, SEED.split(';')):
+                if statement.strip():
+                    connection.execute(
+                        text(statement),
+                        {
+                            'clients': args.clients,
+                            'products': args.products,
+                            'secoes': args.secoes,
+                            'orders': orders,
+                            'order_lines': args.order_lines,
+                        },
+                    )
+
+    secao = f'secao {args.secao}'
+    queries = {
+        'join': join_query(secao),
+        'exists': filter_orders(select(Order), product_secao=secao),
+    }
+
+    with engine.connect() as connection:
+        for name, query in queries.items():
+            for limit in (None, args.limit):
+                paged = query.order_by(Order.id).limit(limit)
+                rows = connection.execute(paged).all()
+                ids = [row.id for row in rows]
+                elapsed, plan = explain_analyze(connection, paged)
+                print(
+                    f'{name:<6} limit={limit!s:<5} rows={len(ids):<8} '
+                    f'distinct={len(set(ids)):<8} {elapsed:9.1f} ms'
+                )
+                if args.verbose:
+                    print(plan)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--order-lines', type=int, default=1_000_000)
+    parser.add_argument('--clients', type=int, default=10_000)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--secoes', type=int, default=200)
+    parser.add_argument('--secao', type=int, default=7)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--verbose', action='store_true')
+    main(parser.parse_args())
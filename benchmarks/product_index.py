@@ -0,0 +1,140 @@
+"""Compare list_products pages from SQL and from the NumPy product index.
+
+Reseeds the products table of the database at DATABASE_URL (use a
+throwaway database) with each catalog size in turn and times the same
+pages through both paths. "pick" is the index choosing the page's ids
+alone; "index" adds fetching those rows by primary key, as
+list_products does. Loading and building the sort orders are timed
+once per size.
+
+    $ python -m benchmarks.product_index --sizes 10000 100000 1000000
+"""
+
+import argparse
+import statistics
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from fast_zero.database import engine
+from fast_zero.models import Product, table_registry
+from fast_zero.product_index import COLUMNS, ProductIndex, by_ids
+from fast_zero.routers.products import (
+    filter_products,
+    filters,
+    list_params,
+    paginate,
+    sort_columns,
+)
+
+SEED = """
+INSERT INTO products (descricao, valor, codigo_barras, secao, categoria,
+                      estoque_inicial, data_validade)
+SELECT 'product ' || g, round((random() * 1000)::numeric, 2), g::text,
+       'secao ' || (g % 200),
+       (ARRAY['eletronics', 'clothing', 'shoes', 'books', 'games'])
+           [1 + g % 5]::categorystate,
+       (random() * 20)::int - 5,
+       CASE WHEN g % 3 = 0 THEN current_date + (g % 400) END
+FROM generate_series(1, :products) g
+"""
+
+PAGES = {
+    'default': {},
+    'categoria': {'categoria': 'books'},
+    'valor range': {'valor_min': 100, 'valor_max': 200, 'sort': 'valor'},
+    'disponivel -valor': {'disponivel': True, 'sort': '-valor'},
+    'deep offset': {'categoria': 'games', 'sort': 'valor', 'offset': 5000},
+}
+
+
+def timed(function, repeat):
+    """Median milliseconds of ``repeat`` calls, and the last result."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def sql_page(session, params):
+    columns, descending = sort_columns(params['sort'])
+    query = paginate(
+        filter_products(select(Product), **filters(params)),
+        columns,
+        cursor=params['cursor'],
+        offset=params['offset'],
+        limit=params['limit'],
+        descending=descending,
+    )
+    return [product.id for product in session.scalars(query)]
+
+
+def index_page(session, index, params):
+    ids = index.page(params)
+    found = {
+        product.id: product
+        for product in session.scalars(select(Product).where(by_ids(ids)))
+    }
+    return [found[id].id for id in ids if id in found]
+
+
+def seed(size):
+    table_registry.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('TRUNCATE products RESTART IDENTITY CASCADE'))
+        connection.execute(text(SEED), {'products': size})
+        connection.execute(text('ANALYZE products'))
+
+
+def main(args):
+    print(
+        f'{"products":>9} {"page":<18} {"sql ms":>9} {"pick ms":>9} '
+        f'{"index ms":>9} {"speedup":>8}'
+    )
+    for size in args.sizes:
+        seed(size)
+        index = ProductIndex()
+        with engine.connect() as connection:
+            load_ms, _ = timed(
+                lambda: index.load_rows(
+                    connection.execute(select(*COLUMNS)).all()
+                ),
+                1,
+            )
+        order_ms, _ = timed(index.build_orders, 1)
+        print(
+            f'{size:>9} {"(load)":<18} {"":>9} {"":>9} {load_ms:>9.1f} '
+            f'{index.stats()["bytes"] / 2**20:>6.1f}MB'
+        )
+        print(f'{size:>9} {"(orders)":<18} {"":>9} {"":>9} {order_ms:>9.1f}')
+
+        with Session(engine) as session:
+            for name, overrides in PAGES.items():
+                params = list_params(**overrides)
+                sql_ms, expected = timed(
+                    lambda: sql_page(session, params), args.repeat
+                )
+                pick_ms, _ = timed(lambda: index.page(params), args.repeat)
+                index_ms, ids = timed(
+                    lambda: index_page(session, index, params), args.repeat
+                )
+                assert ids == expected, name
+                print(
+                    f'{size:>9} {name:<18} {sql_ms:>9.2f} {pick_ms:>9.2f} '
+                    f'{index_ms:>9.2f} {sql_ms / index_ms:>7.1f}x'
+                )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[10_000, 100_000, 1_000_000],
+    )
+    parser.add_argument('--repeat', type=int, default=20)
+    main(parser.parse_args())
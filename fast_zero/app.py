@@ -1,26 +1,94 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 from http import HTTPStatus
 
 import sentry_sdk
 from fastapi import FastAPI
 
-from fast_zero.routers import auth, clients, orders, products, users
+from fast_zero.catalog import catalog_cache
+from fast_zero.database import open_session
+from fast_zero.invalidation import invalidation_bus
+from fast_zero.product_index import product_index
+from fast_zero.routers import (
+    auth,
+    clients,
+    exports,
+    metrics,
+    orders,
+    products,
+    users,
+)
 from fast_zero.schemas import Message
-from fast_zero.security import settings
+from fast_zero.security import evict_principals, flush_principals, settings
 
 sentry_sdk.init(
     dsn=settings.SENTRY_DSN,
     traces_sample_rate=1.0,
     profiles_sample_rate=1.0,
 )
+logger = logging.getLogger(__name__)
+
+invalidation_bus.register('principal', evict_principals, flush_principals)
+invalidation_bus.register(
+    'product', catalog_cache.invalidate_products, catalog_cache.invalidate_all
+)
+if product_index.enabled:
+    invalidation_bus.register(
+        'product',
+        lambda *ids: product_index.refresh(open_session, *ids),
+        lambda: product_index.invalidate(open_session),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = None
+    if invalidation_bus.enabled:
+        listener = asyncio.create_task(
+            invalidation_bus.listen(settings.DATABASE_URL)
+        )
+        # The listener flushes every cache once connected; warming up
+        # before that would be wasted.
+        with suppress(TimeoutError):
+            await asyncio.wait_for(wait_until_listening(), timeout=5)
+    if product_index.enabled and not invalidation_bus.enabled:
+        logger.warning(
+            'PRODUCT_INDEX is on without CACHE_INVALIDATION_CHANNEL: '
+            'writes made by other instances will not reach this index'
+        )
+    if product_index.enabled and not product_index.loaded:
+        try:
+            await product_index.load(open_session)
+        except Exception:
+            logger.exception('Loading the product index failed')
+    if settings.CATALOG_WARM_UP:
+        try:
+            await products.warm_up(open_session)
+        except Exception:
+            logger.exception('Catalog warm-up failed')
+    yield
+    await catalog_cache.stop()
+    if listener:
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+
+
+async def wait_until_listening():
+    while not invalidation_bus.connected:
+        await asyncio.sleep(0.05)
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(clients.router)
 app.include_router(products.router)
 app.include_router(orders.router)
+app.include_router(exports.router)
+app.include_router(metrics.router)
 
 
 @app.get('/sentry-debug')
@@ -0,0 +1,309 @@
+import codecs
+import csv
+import json
+import re
+from http import HTTPStatus
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from fast_zero.settings import Settings
+
+settings = Settings()
+
+JSON_TYPES = {'application/json'}
+NDJSON_TYPES = {'application/x-ndjson', 'application/jsonl'}
+CSV_TYPES = {'text/csv'}
+
+
+class RecordError(str):
+    """A row that couldn't be parsed, carried in place of the record."""
+
+
+# A whole string literal, or an opening quote still waiting for the
+# rest of it, or a character that nests or separates JSON values.
+JSON_STRUCTURE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|"|[\[\]{},]', re.DOTALL)
+WHITESPACE = re.compile(r'\s*')
+# Stands for an element that hasn't fully arrived yet.
+PENDING = object()
+
+
+def invalid_encoding():
+    return HTTPException(
+        status_code=HTTPStatus.BAD_REQUEST, detail='Body is not valid UTF-8.'
+    )
+
+
+def record_too_large():
+    return HTTPException(
+        status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        detail=(
+            f'Records are limited to {settings.BULK_MAX_RECORD_BYTES} bytes.'
+        ),
+    )
+
+
+async def iter_lines(request: Request):
+    """Decode the request body line by line without buffering all of it.
+
+    A line longer than ``BULK_MAX_RECORD_BYTES`` is refused with 413,
+    one that isn't UTF-8 with 400.
+    """
+    pending = b''
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if len(line) > settings.BULK_MAX_RECORD_BYTES:
+                raise record_too_large()
+            yield decode_line(line)
+        if len(pending) > settings.BULK_MAX_RECORD_BYTES:
+            raise record_too_large()
+    if pending:
+        yield decode_line(pending)
+
+
+def decode_line(line: bytes):
+    try:
+        return line.decode().rstrip('\r')
+    except UnicodeDecodeError:
+        raise invalid_encoding()
+
+
+class JSONArrayParser:
+    """Parse the elements of a JSON array as the body arrives.
+
+    Each element is decoded on its own as soon as the text after it
+    shows where it ends, so only the one being read is held in memory.
+    An element that doesn't decode is skipped up to the next comma at
+    its level and reported as a ``RecordError``.
+    """
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.opened = False
+        self.closed = False
+        self.empty = True
+        self.expect_value = True
+
+    def feed(self, text: str):
+        """Take the next piece of the body; return the elements it
+        completed."""
+        self.buffer += text
+        elements = []
+        while not self.closed and (token := self._next_token()):
+            if not self.opened:
+                if token != '[':
+                    raise HTTPException(
+                        status_code=HTTPStatus.BAD_REQUEST,
+                        detail='Expected a JSON array.',
+                    )
+                self.opened = True
+                self.position += 1
+            elif token == ']' and (self.empty or not self.expect_value):
+                self.closed = True
+                self.position += 1
+            elif not self.expect_value and token == ',':
+                self.expect_value = True
+                self.position += 1
+            else:
+                element = self._value() if self.expect_value else self._skip()
+                if element is PENDING:
+                    break
+                elements.append(element)
+                self.empty = self.expect_value = False
+
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+        if self.closed and not self.buffer.strip():
+            self.buffer = ''
+        if len(self.buffer) > settings.BULK_MAX_RECORD_BYTES:
+            raise record_too_large()
+        return elements
+
+    def _next_token(self):
+        self.position = WHITESPACE.match(self.buffer, self.position).end()
+        return self.buffer[self.position : self.position + 1]
+
+    def _value(self):
+        """Decode the element at ``position``, or ``PENDING`` until all
+        of it (and what follows it) has arrived."""
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, self.position)
+        except ValueError:
+            return self._skip()
+        # Only a comma or the closing bracket shows the element is whole:
+        # '1000' or '1000.' may be the start of '1000.5'.
+        following = WHITESPACE.match(self.buffer, end).end()
+        if following == len(self.buffer):
+            return PENDING
+        if self.buffer[following] not in {',', ']'}:
+            return self._skip()
+        self.position = end
+        return value
+
+    def _skip(self):
+        """Skip text that isn't a valid element, up to the next comma or
+        bracket closing the array, going by brackets and strings alone;
+        ``PENDING`` if that hasn't arrived yet."""
+        depth = 0
+        for match in JSON_STRUCTURE.finditer(self.buffer, self.position):
+            token = match.group()
+            if token == '"':
+                return PENDING
+            if token in {'[', '{'}:
+                depth += 1
+            elif token in {']', '}'} and depth:
+                depth -= 1
+            elif token in {']', ','} and not depth:
+                self.position = match.start()
+                return RecordError('Invalid JSON.')
+        return PENDING
+
+
+async def iter_json(request: Request):
+    """Yield the elements of a JSON array body without buffering it.
+
+    Elements that aren't valid JSON, and a body cut off before the
+    array closes, become ``RecordError`` rows.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parser, row = JSONArrayParser(), 0
+    async for chunk in request.stream():
+        for element in parser.feed(decode_chunk(decoder, chunk)):
+            row += 1
+            yield row, element
+    for element in parser.feed(decode_chunk(decoder, b'', final=True)):
+        row += 1
+        yield row, element
+
+    if not parser.opened:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Expected a JSON array.'
+        )
+    if not parser.closed or parser.buffer.strip():
+        yield row + 1, RecordError('Invalid JSON.')
+
+
+def decode_chunk(decoder, chunk: bytes, final=False):
+    try:
+        return decoder.decode(chunk, final)
+    except UnicodeDecodeError:
+        raise invalid_encoding()
+
+
+async def iter_ndjson(request: Request):
+    row = 0
+    async for line in iter_lines(request):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, json.loads(line)
+        except ValueError:
+            yield row, RecordError('Invalid JSON line.')
+
+
+async def iter_csv_rows(request: Request):
+    """Split the body into CSV rows; a quoted field may span lines.
+
+    Lines are held back until the quotes they open are closed, then
+    read together with ``csv.reader``, which keeps the newlines inside
+    quoted fields.
+    """
+    lines, quotes = [], 0
+    async for line in iter_lines(request):
+        if not lines and not line.strip():
+            continue
+        lines.append(line + '\n')
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            for values in csv.reader(lines):
+                yield values
+            lines, quotes = [], 0
+    for values in csv.reader(lines):
+        yield values
+
+
+async def iter_csv(request: Request):
+    header, row = None, 0
+    async for values in iter_csv_rows(request):
+        if not values:
+            continue
+        if header is None:
+            header = values
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, RecordError('Wrong number of columns.')
+            continue
+        yield row, {key: value or None for key, value in zip(header, values)}
+
+
+async def iter_records(request: Request):
+    """Yield ``(row, record_or_error)`` for a JSON, NDJSON or CSV body.
+
+    Rows are numbered from 1 in payload order; a record that can't be
+    parsed is yielded as a ``RecordError`` instead of a dict.
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0]
+
+    if content_type in JSON_TYPES:
+        records = iter_json(request)
+    elif content_type in NDJSON_TYPES:
+        records = iter_ndjson(request)
+    elif content_type in CSV_TYPES:
+        records = iter_csv(request)
+    else:
+        raise HTTPException(
+            status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+            detail='Send application/json, application/x-ndjson or text/csv.',
+        )
+
+    async for row, record in records:
+        yield row, record
+
+
+class RowErrors:
+    """Rows rejected by a bulk request.
+
+    Every one is counted, but only the first ``BULK_MAX_ERRORS`` keep
+    their details, so a body of garbage can't grow the response without
+    bound.
+    """
+
+    def __init__(self, limit: int | None = None):
+        self.limit = settings.BULK_MAX_ERRORS if limit is None else limit
+        self.rows = []
+        self.count = 0
+
+    def add(self, row: int, detail):
+        self.count += 1
+        if len(self.rows) < self.limit:
+            self.rows.append({'row': row, 'detail': detail})
+
+
+async def validated_chunks(request: Request, schema, errors: RowErrors):
+    """Validate records against ``schema`` and yield ``(row, model)`` chunks.
+
+    Invalid rows are added to ``errors`` and left out of the chunks,
+    so at most ``BULK_CHUNK_SIZE`` models are held in memory at a time.
+    """
+    chunk = []
+    async for row, record in iter_records(request):
+        if isinstance(record, RecordError):
+            errors.add(row, record)
+            continue
+        try:
+            chunk.append((row, schema.model_validate(record)))
+        except ValidationError as exc:
+            errors.add(row, json.loads(exc.json(include_url=False)))
+            continue
+        if len(chunk) >= settings.BULK_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
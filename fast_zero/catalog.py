@@ -0,0 +1,369 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime
+
+from fastapi import Request, Response
+
+from fast_zero.cache import TTLCache
+from fast_zero.coalesce import SingleFlight
+from fast_zero.conditional import not_modified
+from fast_zero.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL; the default catalog cache backend.
+
+    Also the local stand-in for a shared backend, since both expose the
+    same small async interface.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str):
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes):
+        self.entries.set(key, value)
+
+    async def delete(self, *keys: str):
+        self.entries.invalidate(*keys)
+
+    async def delete_prefix(self, prefix: str):
+        self.entries.invalidate_prefix(prefix)
+
+    async def clear(self):
+        self.entries.clear()
+
+    async def stats(self):
+        stats = self.entries.stats()
+        return {
+            'backend': 'memory',
+            'entries': stats['size'],
+            'maxsize': stats['maxsize'],
+            'bytes': self.entries.nbytes(),
+        }
+
+
+class RedisBackend:
+    """Cache shared by every node, in Redis at ``CATALOG_CACHE_URL``.
+
+    Dropping a prefix would mean scanning the keyspace on every product
+    write, so the prefixes ``delete_prefix`` drops, and ``clear``, are
+    versioned instead: each has a generation counter that is part of its
+    keys, and bumping it leaves the old entries to expire unread.
+
+    ``redis`` is only imported when this backend is configured.
+    """
+
+    namespace = 'catalog:'
+    versioned = ('products:list:',)
+
+    def __init__(self, url: str, ttl: float):
+        from redis import asyncio as redis  # noqa: PLC0415
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+
+    def generation_key(self, prefix: str = ''):
+        return f'{self.namespace}generation:{prefix}'
+
+    async def generations(self):
+        """The current generation of the whole cache and of each
+        versioned prefix, in one round trip."""
+        prefixes = ('', *self.versioned)
+        values = await self.client.mget([
+            self.generation_key(prefix) for prefix in prefixes
+        ])
+        return {
+            prefix: int(value or 0) for prefix, value in zip(prefixes, values)
+        }
+
+    def versioned_key(self, key: str, generations: dict):
+        parts = [str(generations[''])]
+        parts += [
+            f'{prefix}{generations[prefix]}'
+            for prefix in self.versioned
+            if key.startswith(prefix)
+        ]
+        return f'{self.namespace}{":".join(parts)}:{key}'
+
+    async def get(self, key: str):
+        generations = await self.generations()
+        return await self.client.get(self.versioned_key(key, generations))
+
+    async def set(self, key: str, value: bytes):
+        generations = await self.generations()
+        await self.client.set(
+            self.versioned_key(key, generations),
+            value,
+            px=int(self.ttl * 1000),
+        )
+
+    async def delete(self, *keys: str):
+        if keys:
+            generations = await self.generations()
+            await self.client.unlink(
+                *(self.versioned_key(key, generations) for key in keys)
+            )
+
+    async def delete_prefix(self, prefix: str):
+        if prefix not in self.versioned:
+            raise ValueError(f'{prefix!r} is not a versioned prefix')
+        await self.client.incr(self.generation_key(prefix))
+
+    async def clear(self):
+        await self.client.incr(self.generation_key())
+
+    async def stats(self):
+        """Counts live entries only: other keys in the database, and
+        entries of older generations, are left out."""
+        generations = await self.generations()
+        current = f'{self.namespace}{generations[""]}:'
+        versioned = tuple(
+            (current + prefix).encode() for prefix in self.versioned
+        )
+        live = tuple(
+            self.versioned_key(prefix, generations).encode()
+            for prefix in self.versioned
+        )
+        entries = 0
+        async for key in self.client.scan_iter(match=f'{current}*'):
+            # Under a versioned prefix, only its current generation.
+            if not key.startswith(versioned) or key.startswith(live):
+                entries += 1
+        return {
+            'backend': 'redis',
+            'entries': entries,
+            'generations': generations,
+        }
+
+
+class CatalogCache:
+    """Serialized product responses keyed by their normalized parameters.
+
+    Entries keep the JSON body with its validators, so a hit skips both
+    the query and serialization and can still answer with a 304. Writes
+    to products invalidate explicitly; the TTL bounds anything missed.
+    Concurrent misses for the same key share a single load.
+
+    Past ``fresh_seconds`` an entry may still be served for its staleness
+    bound (per category) while a single background task reloads it, so
+    expiry alone never makes a caller wait on the query.
+
+    Every invalidation bumps ``generation``: loads started before it
+    don't store their result, and later requests don't join them.
+    """
+
+    def __init__(
+        self,
+        backend,
+        fresh_seconds: float,
+        stale_seconds: float = 0,
+        category_stale_seconds: dict | None = None,
+    ):
+        self.backend = backend
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.category_stale_seconds = category_stale_seconds or {}
+        self.flights = SingleFlight()
+        self.generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._queue = None
+        self._queued = set()
+        self._refresher = None
+
+    @staticmethod
+    def key(scope: str, **params):
+        return f'{scope}:' + json.dumps(
+            params, sort_keys=True, default=str, separators=(',', ':')
+        )
+
+    def stale_for(self, category: str | None = None):
+        """How long past fresh an entry for ``category`` may be served."""
+        return self.category_stale_seconds.get(category, self.stale_seconds)
+
+    async def serve(  # noqa: PLR0913, PLR0917
+        self,
+        request: Request,
+        key: str,
+        load,
+        session,
+        session_factory,
+        stale_seconds: float | None = None,
+    ):
+        """Answer from the cache, or from ``load(session)`` on a miss.
+
+        ``load`` returns ``(body, etag, last_modified)``, or ``None`` for
+        nothing worth caching; identical requests arriving while it runs
+        wait for its result instead of loading again. A stale hit is
+        answered at once and queued for a refresh on a session from
+        ``session_factory``.
+        """
+        entry = await self.backend.get(key)
+        if entry is not None:
+            header, body = entry.split(b'\n', 1)
+            header = json.loads(header)
+            age = time.time() - header['stored_at']
+            if age <= self.fresh_seconds + header['stale_seconds']:
+                if age <= self.fresh_seconds:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self.refresh(key, load, session_factory, stale_seconds)
+                last_modified = header['last_modified']
+                return self.reply(
+                    request,
+                    body,
+                    header['etag'],
+                    last_modified and datetime.fromisoformat(last_modified),
+                )
+
+        self.misses += 1
+        entry = await self.load(key, lambda: load(session), stale_seconds)
+        return entry and self.reply(request, *entry)
+
+    async def load(self, key: str, load, stale_seconds: float | None = None):
+        generation = self.generation
+
+        async def run():
+            entry = await load()
+            if entry is not None and generation == self.generation:
+                await self.store(key, *entry, stale_seconds=stale_seconds)
+            return entry
+
+        return await self.flights.run((generation, key), run)
+
+    async def prime(self, key: str, load, session_factory, stale_seconds=None):
+        """Load ``key`` on a session of its own and cache it."""
+
+        async def load_in_session():
+            async with session_factory() as session:
+                return await load(session)
+
+        return await self.load(key, load_in_session, stale_seconds)
+
+    def refresh(self, key: str, load, session_factory, stale_seconds=None):
+        """Queue ``key`` for the background refresher, once."""
+        loop = asyncio.get_running_loop()
+        if (
+            self._refresher is None
+            or self._refresher.done()
+            or self._refresher.get_loop() is not loop
+        ):
+            self._queue = asyncio.Queue()
+            self._queued.clear()
+            self._refresher = loop.create_task(self._refresh_queued())
+
+        if key not in self._queued:
+            self._queued.add(key)
+            self._queue.put_nowait((key, load, session_factory, stale_seconds))
+
+    async def _refresh_queued(self):
+        while True:
+            key, load, session_factory, stale_seconds = await self._queue.get()
+            try:
+                await self.prime(key, load, session_factory, stale_seconds)
+                self.refreshes += 1
+            except Exception:
+                self.refresh_failures += 1
+                logger.exception('Refreshing catalog entry %s failed', key)
+            finally:
+                self._queued.discard(key)
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._refresher
+            self._refresher = None
+
+    async def store(  # noqa: PLR0913
+        self,
+        key: str,
+        body: bytes,
+        etag: str,
+        last_modified: datetime | None = None,
+        *,
+        stale_seconds: float | None = None,
+    ):
+        header = json.dumps({
+            'etag': etag,
+            'last_modified': last_modified and last_modified.isoformat(),
+            'stored_at': time.time(),
+            'stale_seconds': self.stale_seconds
+            if stale_seconds is None
+            else stale_seconds,
+        })
+        await self.backend.set(key, header.encode() + b'\n' + body)
+
+    @staticmethod
+    def reply(request, body, etag, last_modified=None):
+        response = Response(body, media_type='application/json')
+        return not_modified(request, response, etag, last_modified) or response
+
+    async def invalidate_products(self, *product_ids: int):
+        self.generation += 1
+        await self.backend.delete(
+            *(
+                self.key('products:show', id=product_id)
+                for product_id in product_ids
+            )
+        )
+        await self.backend.delete_prefix('products:list:')
+
+    async def invalidate_all(self):
+        self.generation += 1
+        await self.backend.clear()
+
+    async def clear(self):
+        await self.invalidate_all()
+        self.flights.reset()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    async def stats(self):
+        served = self.hits + self.stale_hits
+        lookups = served + self.misses
+        return {
+            **await self.backend.stats(),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': served / lookups if lookups else None,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+        }
+
+
+def make_backend():
+    # Entries live on through the longest staleness bound; whether one is
+    # still fresh is decided from when it was stored.
+    ttl = settings.CATALOG_CACHE_TTL_SECONDS + max([
+        settings.CATALOG_STALE_SECONDS,
+        *settings.CATALOG_CATEGORY_STALE_SECONDS.values(),
+    ])
+    if settings.CATALOG_CACHE_URL:
+        return RedisBackend(settings.CATALOG_CACHE_URL, ttl)
+    return MemoryBackend(settings.CATALOG_CACHE_MAXSIZE, ttl)
+
+
+catalog_cache = CatalogCache(
+    make_backend(),
+    fresh_seconds=settings.CATALOG_CACHE_TTL_SECONDS,
+    stale_seconds=settings.CATALOG_STALE_SECONDS,
+    category_stale_seconds=settings.CATALOG_CATEGORY_STALE_SECONDS,
+)
@@ -0,0 +1,53 @@
+import asyncio
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key.
+
+    The first caller for a key runs the work; anyone asking for that key
+    before it finishes waits for the same result (or exception) instead
+    of repeating it. If the caller doing the work is cancelled, a
+    waiting caller takes over.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key, work):
+        while flight := self._flights.get(key):
+            self.coalesced += 1
+            await asyncio.wait({flight})
+            if not flight.cancelled():
+                return flight.result()
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        self.leaders += 1
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as exc:
+            flight.set_exception(exc)
+            # Retrieved so a failure nobody waited for isn't logged.
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+        }
+
+    def reset(self):
+        self.leaders = 0
+        self.coalesced = 0
@@ -0,0 +1,64 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+
+from fastapi import Request, Response
+
+from fast_zero.streaming import etag_matches
+
+
+def make_etag(*values, weak=False):
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=16)
+    return f'{"W/" if weak else ""}"{digest.hexdigest()}"'
+
+
+def http_date(value: datetime):
+    # Timestamps are stored naive in UTC.
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def modified_since(header: str | None, last_modified: datetime):
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:  # '-0000' and asctime dates carry no zone
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) > since
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: datetime | None = None,
+):
+    """Put validators on ``response`` and answer 304 if they still match.
+
+    Returns the 304 to send, or ``None`` when the caller should build the
+    body as usual. ``If-None-Match`` wins over ``If-Modified-Since``.
+    """
+    headers = {'ETag': etag}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        current = etag_matches(if_none_match, etag.removeprefix('W/'))
+    elif last_modified and 'if-modified-since' in request.headers:
+        current = not modified_since(
+            request.headers['if-modified-since'], last_modified
+        )
+    else:
+        current = False
+
+    if current:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return None
+
+
+def page_etag(rows, version, next_cursor=None):
+    """Weak validator for a page of rows, from ``version(row)`` of each."""
+    return make_etag(next_cursor, *map(version, rows), weak=True)
@@ -1,14 +1,131 @@
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
 
 from fast_zero.settings import Settings
 
+settings = Settings()
+
 engine = create_engine(
-    Settings().DATABASE_URL,
+    settings.DATABASE_URL,
+    # echo=True,
+)
+async_engine = create_async_engine(
+    settings.DATABASE_URL,
     # echo=True,
 )
 
 
-def get_session():
-    with Session(engine) as session:
+class ThreadedSession:
+    """Awaitable facade over a sync ``Session``.
+
+    Exposes the part of the ``AsyncSession`` API used by the routers and
+    runs every database round trip on the AnyIO thread pool, so the same
+    ``async def`` handlers work when ``DATABASE_ASYNC`` is disabled.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.execute, statement, *args, **kwargs
+        )
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalars, statement, *args, **kwargs
+        )
+
+    async def stream(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(
+            self.sync_session.execute,
+            statement.execution_options(stream_results=True),
+            *args,
+            **kwargs,
+        )
+        return ThreadedStream(result)
+
+    async def stream_scalars(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(
+            self.sync_session.scalars,
+            statement.execution_options(stream_results=True),
+            *args,
+            **kwargs,
+        )
+        return ThreadedStream(result)
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+class ThreadedStream:
+    """Async partitions over a server-side cursor read on the thread pool."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def keys(self):
+        return self.result.keys()
+
+    async def partitions(self, size=None):
+        partitions = self.result.partitions(size)
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+
+
+@asynccontextmanager
+async def open_session():
+    if settings.DATABASE_ASYNC:
+        async with AsyncSession(
+            async_engine, expire_on_commit=False
+        ) as session:
+            yield session
+    else:
+        session = ThreadedSession(Session(engine, expire_on_commit=False))
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def get_session():
+    async with open_session() as session:
         yield session
+
+
+def get_session_factory():
+    """Session opener for work that outlives the request's dependencies."""
+    return open_session
@@ -0,0 +1,181 @@
+import csv
+import gzip
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+
+from fast_zero.settings import Settings
+
+settings = Settings()
+
+
+@dataclass
+class ExportJob:
+    id: str
+    path: str
+    state: str = 'queued'
+    rows_written: int = 0
+    total_rows: int | None = None
+    error: str | None = None
+    created_at: datetime = field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+    finished_at: datetime | None = None
+
+
+def open_gzip_csv(path: str):
+    return gzip.open(path, 'wt', encoding='utf-8', newline='')
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def csv_values(row):
+    return [value.value if isinstance(value, Enum) else value for value in row]
+
+
+class ExportRunner:
+    """Node-local registry of CSV export jobs.
+
+    Files land on local disk, so jobs are tracked in memory on the node
+    that writes them. At most ``max_jobs`` may be queued or running at
+    once; further submissions get a 503 instead of competing for
+    database connections. Jobs and their files are forgotten
+    ``retention_seconds`` after they finish (or were queued, for a job
+    that never started).
+    """
+
+    def __init__(self, max_jobs: int, retention_seconds: float):
+        self.max_jobs = max_jobs
+        self.retention_seconds = retention_seconds
+        self.jobs = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def active(self):
+        return sum(
+            job.state in {'queued', 'running'} for job in self.jobs.values()
+        )
+
+    def submit(self, directory: str, suffix: str = '.csv.gz'):
+        if self.active >= self.max_jobs:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Too many exports running, try again later.',
+                headers={'Retry-After': '30'},
+            )
+
+        job_id = uuid.uuid4().hex
+        job = ExportJob(
+            id=job_id, path=os.path.join(directory, job_id + suffix)
+        )
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def prune(self):
+        """Drop jobs past the retention period and delete their files."""
+        cutoff = datetime.now(timezone.utc) - timedelta(
+            seconds=self.retention_seconds
+        )
+        expired = [
+            job
+            for job in self.jobs.values()
+            if (job.finished_at or job.created_at) < cutoff
+            and job.state != 'running'
+        ]
+        for job in expired:
+            del self.jobs[job.id]
+        self.expired += len(expired)
+        await run_in_threadpool(
+            remove_files,
+            [
+                path
+                for job in expired
+                for path in (job.path, f'{job.path}.part')
+            ],
+        )
+
+    async def run(self, job: ExportJob, session_factory, query):
+        """Write ``query`` to ``job.path`` as gzip CSV, one partition at a time.
+
+        Rows come from a server-side cursor and the compression happens
+        on the thread pool; the file only appears under its final name
+        once it is complete. A job cancelled midway (e.g. at shutdown)
+        still ends up ``failed``, so it stops counting as active.
+        """
+        job.state = 'running'
+        partial = f'{job.path}.part'
+        try:
+            await run_in_threadpool(
+                os.makedirs, os.path.dirname(job.path), exist_ok=True
+            )
+            async with session_factory() as session:
+                job.total_rows = await session.scalar(
+                    select(func.count()).select_from(
+                        query.order_by(None).subquery()
+                    )
+                )
+                result = await session.stream(
+                    query.execution_options(
+                        yield_per=settings.STREAM_BATCH_SIZE
+                    )
+                )
+                file = await run_in_threadpool(open_gzip_csv, partial)
+                try:
+                    writer = csv.writer(file)
+                    await run_in_threadpool(writer.writerow, result.keys())
+                    async for partition in result.partitions():
+                        await run_in_threadpool(
+                            writer.writerows, map(csv_values, partition)
+                        )
+                        job.rows_written += len(partition)
+                finally:
+                    await run_in_threadpool(file.close)
+
+            await run_in_threadpool(os.replace, partial, job.path)
+            job.state = 'done'
+            self.completed += 1
+        except Exception as exc:
+            job.state, job.error = 'failed', str(exc)
+        finally:
+            if job.state != 'done':
+                if job.state == 'running':
+                    job.state, job.error = 'failed', 'Export was cancelled.'
+                self.failed += 1
+                # No awaiting here: the task may be being cancelled.
+                remove_files([partial])
+            job.finished_at = datetime.now(timezone.utc)
+
+    def stats(self):
+        return {
+            'max_jobs': self.max_jobs,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+        }
+
+
+export_runner = ExportRunner(
+    settings.EXPORT_MAX_JOBS, settings.EXPORT_RETENTION_SECONDS
+)
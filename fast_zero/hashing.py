@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from pwdlib import PasswordHash
+
+pwd_context = PasswordHash.recommended()
+
+
+def hash_password(password: str):
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HashingPool:
+    """Size-limited process pool for Argon2 work.
+
+    At most ``max_workers`` hashes run at once and ``max_queue`` more may
+    wait; anything beyond that is rejected straight away with a 503 so a
+    login storm can't pile up behind the event loop.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Too many password operations, try again later.',
+                headers={'Retry-After': '1'},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str):
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str):
+        return await self.run(check_password, plain_password, hashed_password)
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': min(self.pending, self.max_workers),
+            'queued': max(self.pending - self.max_workers, 0),
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,429 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from fast_zero.models import ProductImage, ProductImageVariant
+from fast_zero.settings import Settings
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - variants need Pillow
+    Image = None
+
+settings = Settings()
+
+CHUNK_SIZE = 64 * 1024
+INCOMING = '.incoming'
+
+# Accepted types, the extension they're stored under and the leading
+# bytes a real file of that type starts with.
+IMAGE_TYPES = {
+    'image/png': ('png', (b'\x89PNG\r\n\x1a\n',)),
+    'image/jpeg': ('jpeg', (b'\xff\xd8\xff',)),
+    'image/gif': ('gif', (b'GIF87a', b'GIF89a')),
+    'image/webp': ('webp', (b'RIFF',)),
+}
+
+
+def image_path(file_name: str):
+    return os.path.join(settings.IMAGE_DIR, file_name)
+
+
+def blob_name(content_hash: str, extension: str):
+    """Sharded name for a file, e.g. ``ab/cd/abcd…ef.png``.
+
+    Two levels of 256 directories keep each one small even with
+    millions of images, and identical content always lands on the same
+    path.
+    """
+    return os.path.join(
+        content_hash[:2], content_hash[2:4], f'{content_hash}.{extension}'
+    )
+
+
+def place_blob(partial: str, file_name: str):
+    """Move ``partial`` to ``file_name``, or drop it if that exists.
+
+    Call it with the blob locked (``lock_blobs``) until the row that
+    references it commits, so the copy on disk can't be reclaimed in
+    between.
+    """
+    path = image_path(file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(partial)
+    else:
+        os.replace(partial, path)
+
+
+def blobs_exist(file_names):
+    return all(os.path.exists(image_path(name)) for name in file_names)
+
+
+def link_blob(path: str, file_name: str):
+    """Give the file at ``path`` its content-addressed name too."""
+    target = image_path(file_name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        return
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copyfile(path, target)
+
+
+def hash_file(path: str):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_type(content_type: str | None, head: bytes):
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(
+            status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+            detail='Images must be PNG, JPEG, GIF or WebP.',
+        )
+
+    _, signatures = IMAGE_TYPES[content_type]
+    if not head.startswith(signatures) or (
+        content_type == 'image/webp' and head[8:12] != b'WEBP'
+    ):
+        raise HTTPException(
+            status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+            detail=f'File content does not match {content_type}.',
+        )
+
+
+async def store_upload(upload: UploadFile):
+    """Copy an upload into ``IMAGE_DIR``.
+
+    Returns ``(partial, file_name, hash)``: the file is streamed in
+    chunks to the scratch name ``partial`` while its SHA-256 is
+    computed, and ``place_blob`` later moves it to its content-addressed
+    ``file_name``. The type is checked against the first chunk and the
+    size as bytes arrive. Disk I/O runs on worker threads.
+    """
+    extension, _ = IMAGE_TYPES.get(upload.content_type, (None, None))
+    incoming = image_path(INCOMING)
+    await run_in_threadpool(os.makedirs, incoming, exist_ok=True)
+    partial_name = os.path.join(INCOMING, f'{uuid.uuid4()}.part')
+    partial = image_path(partial_name)
+
+    size, digest = 0, hashlib.sha256()
+    try:
+        async with await anyio.open_file(partial, 'wb') as file:
+            while chunk := await upload.read(CHUNK_SIZE):
+                if not size:
+                    check_type(upload.content_type, chunk)
+                size += len(chunk)
+                if size > settings.IMAGE_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                        detail=(
+                            f'Images are limited to '
+                            f'{settings.IMAGE_MAX_BYTES} bytes.'
+                        ),
+                    )
+                digest.update(chunk)
+                await file.write(chunk)
+        if not size:
+            check_type(upload.content_type, b'')
+    except BaseException:
+        await remove_images([partial_name])
+        raise
+
+    content_hash = digest.hexdigest()
+    return partial_name, blob_name(content_hash, extension), content_hash
+
+
+async def lock_blobs(session, hashes):
+    """Lock the files of ``hashes`` until the transaction ends.
+
+    Placing a file and committing the row that references it, and
+    counting a file's references and unlinking it, each happen under
+    this lock, so a file can't be removed while an upload is reusing it.
+    Hashes are locked in order so two transactions can't deadlock.
+    """
+    for content_hash in sorted(set(filter(None, hashes))):
+        await session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(content_hash)))
+        )
+
+
+async def orphaned_files(session, images):
+    """File names from ``(file_name, content_hash)`` pairs no row uses.
+
+    Rows sharing a hash share the file, so the image and variant rows
+    that reference a hash are its reference count; a file can go once
+    that reaches zero. Legacy rows without a hash own their file
+    outright.
+    """
+    images = set(images)
+    hashes = {content_hash for _, content_hash in images if content_hash}
+    referenced = set()
+    if hashes:
+        referenced.update(
+            await session.scalars(
+                union(
+                    select(ProductImage.content_hash).where(
+                        ProductImage.content_hash.in_(hashes)
+                    ),
+                    select(ProductImageVariant.content_hash).where(
+                        ProductImageVariant.content_hash.in_(hashes)
+                    ),
+                )
+            )
+        )
+
+    return {
+        file_name
+        for file_name, content_hash in images
+        if content_hash not in referenced
+    }
+
+
+async def remove_orphans(session_factory, images):
+    """Remove the files of ``(file_name, content_hash)`` pairs no
+    committed row references any more."""
+    images = list(images)
+    async with session_factory() as session:
+        await lock_blobs(session, (content_hash for _, content_hash in images))
+        await remove_images(await orphaned_files(session, images))
+        await session.rollback()
+
+
+def unlink_images(file_names):
+    for file_name in file_names:
+        try:
+            os.remove(image_path(file_name))
+        except FileNotFoundError:
+            pass
+
+
+async def remove_images(file_names):
+    await run_in_threadpool(unlink_images, list(file_names))
+
+
+def render_variants(path: str, incoming: str, thumbnail_size: int):
+    """Write the WebP renditions of ``path``; runs in a worker process."""
+    rendered = []
+    with Image.open(path) as source:
+        source.load()
+        for kind, box in (('thumbnail', thumbnail_size), ('webp', None)):
+            image = source.copy()
+            if image.mode not in {'RGB', 'RGBA'}:
+                image = image.convert('RGBA')
+            if box:
+                image.thumbnail((box, box))
+            partial = os.path.join(incoming, f'{uuid.uuid4()}.part')
+            image.save(partial, 'WEBP')
+            rendered.append({
+                'kind': kind,
+                'partial': partial,
+                'width': image.width,
+                'height': image.height,
+                'content_hash': hash_file(partial),
+            })
+    return rendered
+
+
+async def existing_variants(session, content_hash: str):
+    """Variants already rendered for the same content, one per kind."""
+    variants = (
+        await session.scalars(
+            select(ProductImageVariant)
+            .join(ProductImage)
+            .where(ProductImage.content_hash == content_hash)
+            .order_by(ProductImageVariant.id)
+        )
+    ).all()
+    return list({variant.kind: variant for variant in variants}.values())
+
+
+async def reusable_variants(session, content_hash: str):
+    """Variants already on disk for the same content, locked until
+    the transaction ends; ``None`` if there are none to share."""
+    existing = await existing_variants(session, content_hash)
+    await lock_blobs(session, (variant.content_hash for variant in existing))
+    if not existing or not await run_in_threadpool(
+        blobs_exist, [variant.file_name for variant in existing]
+    ):
+        await session.rollback()
+        return None
+    return [
+        {
+            'kind': variant.kind,
+            'file_name': variant.file_name,
+            'width': variant.width,
+            'height': variant.height,
+            'content_hash': variant.content_hash,
+        }
+        for variant in existing
+    ]
+
+
+class VariantPool:
+    """Process pool that renders image variants after uploads commit.
+
+    Decoding and re-encoding images is CPU bound, so it happens in
+    ``max_workers`` spawned processes instead of on the event loop or
+    the thread pool the request handlers share.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.completed = 0
+        self.failed = 0
+        self.reused = 0
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    async def render(self, file_name: str):
+        """Render the variants of ``file_name`` to scratch files, left
+        for ``place_blob`` under ``partial``."""
+        incoming = image_path(INCOMING)
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            self.executor,
+            render_variants,
+            image_path(file_name),
+            incoming,
+            settings.IMAGE_THUMBNAIL_SIZE,
+        )
+        for variant in rendered:
+            variant['file_name'] = blob_name(variant['content_hash'], 'webp')
+        return rendered
+
+    async def generate(self, session_factory, images):
+        """Record variants for ``(image_id, file_name, content_hash)``.
+
+        Content seen before reuses the existing files; anything else is
+        rendered in the pool. An image replaced in the meantime just
+        leaves its freshly rendered files to be cleaned up.
+        """
+        for image_id, file_name, content_hash in images:
+            async with session_factory() as session:
+                rendered = await reusable_variants(session, content_hash)
+                if rendered is not None:
+                    self.reused += 1
+                else:
+                    try:
+                        rendered = await self.render(file_name)
+                    except Exception:
+                        self.failed += 1
+                        continue
+                    await lock_blobs(
+                        session,
+                        (variant['content_hash'] for variant in rendered),
+                    )
+                    for variant in rendered:
+                        await run_in_threadpool(
+                            place_blob,
+                            variant.pop('partial'),
+                            variant['file_name'],
+                        )
+
+                session.add_all([
+                    ProductImageVariant(
+                        image_id=image_id, file_type='image/webp', **variant
+                    )
+                    for variant in rendered
+                ])
+                try:
+                    await session.commit()
+                    self.completed += 1
+                except IntegrityError:
+                    await session.rollback()
+                    await remove_orphans(
+                        session_factory,
+                        (
+                            (variant['file_name'], variant['content_hash'])
+                            for variant in rendered
+                        ),
+                    )
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'workers': self.max_workers,
+            'completed': self.completed,
+            'reused': self.reused,
+            'failed': self.failed,
+        }
+
+
+variant_pool = VariantPool(settings.IMAGE_VARIANT_WORKERS)
+
+
+def migrate_legacy_images(engine, batch_size=None):
+    """Move flat ``uuid`` named files into the content-addressed layout.
+
+    Rows without a hash are handled in id order, a batch per commit.
+    Each file is linked under its new name before the row changes and
+    the old name is only removed after the commit, so the tool can be
+    interrupted and run again.
+    """
+    batch_size = batch_size or settings.STREAM_BATCH_SIZE
+    moved, missing, last_id = 0, 0, 0
+
+    with Session(engine) as session:
+        while batch := session.scalars(
+            select(ProductImage)
+            .where(ProductImage.content_hash.is_(None))
+            .where(ProductImage.id > last_id)
+            .order_by(ProductImage.id)
+            .limit(batch_size)
+        ).all():
+            last_id = batch[-1].id
+            legacy = []
+            for image in batch:
+                path = image_path(image.file_name)
+                try:
+                    content_hash = hash_file(path)
+                except FileNotFoundError:
+                    missing += 1
+                    continue
+                extension = os.path.splitext(image.file_name)[1].lstrip('.')
+                file_name = blob_name(content_hash, extension)
+                link_blob(path, file_name)
+                legacy.append(image.file_name)
+                image.file_name, image.content_hash = file_name, content_hash
+            session.commit()
+            unlink_images(legacy)
+            moved += len(legacy)
+
+    return {'moved': moved, 'missing': missing}
+
+
+if __name__ == '__main__':
+    from fast_zero.database import engine
+
+    print(json.dumps(migrate_legacy_images(engine)))
@@ -0,0 +1,185 @@
+import asyncio
+import inspect
+import json
+import logging
+import uuid
+
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from fast_zero.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads are capped at 8000 bytes, so keys are spread over as
+# many notices as needed.
+MAX_PAYLOAD = 7900
+
+
+class InvalidationBus:
+    """Keeps the in-process caches of every node coherent via Postgres.
+
+    Writers ``publish`` an entity and the keys that changed inside their
+    own transaction, so ``NOTIFY`` is only delivered if the write
+    commits. Each worker runs ``listen``, which evicts those keys from
+    its local caches. Whenever the listening connection is (re)opened,
+    notifications may have been missed, so every cache is flushed.
+    """
+
+    def __init__(
+        self,
+        channel: str | None,
+        reconnect_seconds: float = 1,
+        keepalive_seconds: int = 30,
+    ):
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.node = uuid.uuid4().hex
+        self.handlers = {}
+        self.received = 0
+        self.flushes = 0
+        self.reconnects = 0
+        self.connected = False
+
+    @property
+    def enabled(self):
+        return self.channel is not None
+
+    def register(self, entity: str, evict, flush):
+        """Handle ``entity`` notices with ``evict(*keys)``; ``flush()``
+        drops everything. Either may be a coroutine function, and an
+        entity may have several pairs.
+        """
+        self.handlers.setdefault(entity, []).append((evict, flush))
+
+    async def publish(self, session, entity: str, *keys):
+        """Notify ``keys`` of ``entity`` when ``session`` commits."""
+        if not self.enabled:
+            return
+
+        await session.execute(
+            select(
+                *(
+                    func.pg_notify(self.channel, payload)
+                    for payload in self.payloads(entity, keys)
+                )
+            )
+        )
+
+    def payloads(self, entity: str, keys):
+        """Notices for ``keys``, split so each one fits in a NOTIFY."""
+        notice = {'node': self.node, 'entity': entity}
+        empty = len(json.dumps({**notice, 'keys': []}))
+        payloads, chunk, size = [], [], empty
+        for key in keys:
+            length = len(json.dumps(key)) + 2  # plus the ', ' separator
+            if empty + length > MAX_PAYLOAD:
+                # A key that can't fit on its own: flush the entity.
+                return [json.dumps(notice)]
+            if chunk and size + length > MAX_PAYLOAD:
+                payloads.append(json.dumps({**notice, 'keys': chunk}))
+                chunk, size = [], empty
+            chunk.append(key)
+            size += length
+        if chunk or not payloads:
+            payloads.append(json.dumps({**notice, 'keys': chunk}))
+        return payloads
+
+    async def dispatch(self, payload: str):
+        self.received += 1
+        try:
+            notice = json.loads(payload)
+            handlers = self.handlers[notice['entity']]
+        except (ValueError, KeyError, TypeError):
+            await self.flush()
+            return
+
+        if notice.get('node') == self.node:
+            return  # the writer already evicted locally
+        for evict, flush in handlers:
+            if 'keys' in notice:
+                await call(evict, *notice['keys'])
+            else:
+                await call(flush)
+
+    async def flush(self):
+        self.flushes += 1
+        for handlers in self.handlers.values():
+            for _, flush in handlers:
+                await call(flush)
+
+    async def listen(self, url: str):
+        """Evict on every notice until cancelled, reconnecting as needed."""
+        conninfo = self.conninfo(url)
+        delay = self.reconnect_seconds
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    conninfo, autocommit=True
+                ) as connection:
+                    await connection.execute(
+                        sql.SQL('LISTEN {}').format(
+                            sql.Identifier(self.channel)
+                        )
+                    )
+                    self.connected = True
+                    delay = self.reconnect_seconds
+                    await self.flush()
+                    async for notify in connection.notifies():
+                        await self.dispatch(notify.payload)
+            except Exception:
+                # Anything but cancellation: a listener that stops
+                # leaves this node serving stale caches for good.
+                logger.exception(
+                    'Cache invalidation listener failed; retrying in %.1fs',
+                    delay,
+                )
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def conninfo(self, url: str):
+        """libpq settings for the listening connection.
+
+        It only ever waits for notices, so a peer that vanished (a
+        failover, a NAT dropping the flow) would never be noticed; TCP
+        keepalives make the socket fail within a couple of minutes and
+        ``listen`` reconnect.
+        """
+        return make_conninfo(
+            make_url(url)
+            .set(drivername='postgresql')
+            .render_as_string(hide_password=False),
+            keepalives=1,
+            keepalives_idle=self.keepalive_seconds,
+            keepalives_interval=max(self.keepalive_seconds // 3, 1),
+            keepalives_count=3,
+        )
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'connected': self.connected,
+            'received': self.received,
+            'flushes': self.flushes,
+            'reconnects': self.reconnects,
+        }
+
+
+async def call(handler, *args):
+    # A failing handler must not take the listener down with it.
+    try:
+        result = handler(*args)
+        if inspect.isawaitable(result):
+            await result
+    except Exception:
+        logger.exception('Cache invalidation handler failed')
+
+
+invalidation_bus = InvalidationBus(settings.CACHE_INVALIDATION_CHANNEL)
@@ -1,8 +1,9 @@
 from datetime import date, datetime
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, func, select
 from sqlalchemy.orm import (
     Mapped,
+    column_property,
     declarative_base,
     mapped_column,
     registry,
@@ -51,15 +52,22 @@ class Client:
 @table_registry.mapped_as_dataclass
 class Product:
     __tablename__ = 'products'
+    __table_args__ = (
+        Index('ix_products_valor_id', 'valor', 'id'),
+        Index('ix_products_categoria_valor_id', 'categoria', 'valor', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     descricao: Mapped[str]
     valor: Mapped[float]
     codigo_barras: Mapped[str]
-    secao: Mapped[str]
+    secao: Mapped[str] = mapped_column(index=True)
     categoria: Mapped[CategoryState]
     estoque_inicial: Mapped[int]
     data_validade: Mapped[date] = mapped_column(nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), onupdate=func.now()
+    )
     orders: Mapped[list['Order']] = relationship(
         init=False,
         secondary='order_products',
@@ -73,6 +81,12 @@ class Product:
 @table_registry.mapped_as_dataclass
 class Order:
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_client_id_created_at', 'client_id', 'created_at'),
+        Index('ix_orders_state_created_at', 'state', 'created_at'),
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+        Index('ix_orders_updated_at', 'updated_at'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     state: Mapped[OrderState]
@@ -81,6 +95,9 @@ class Order:
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
     )
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), onupdate=func.now()
+    )
     products: Mapped[list['Product']] = relationship(
         init=False,
         secondary='order_products',
@@ -96,7 +113,7 @@ class OrderProduct:
         ForeignKey('orders.id'), primary_key=True
     )
     product_id: Mapped[int] = mapped_column(
-        ForeignKey('products.id'), primary_key=True
+        ForeignKey('products.id'), primary_key=True, index=True
     )
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
@@ -110,10 +127,69 @@ class ProductImage:
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     file_name: Mapped[str]
     file_type: Mapped[str]
-    product_id: Mapped[int] = mapped_column(ForeignKey('products.id'))
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey('products.id'), index=True
+    )
+    content_hash: Mapped[str | None] = mapped_column(default=None, index=True)
     product: Mapped[Product] = relationship(
         init=False, back_populates='product_images'
     )
+    variants: Mapped[list['ProductImageVariant']] = relationship(
+        init=False,
+        back_populates='image',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+
+
+@table_registry.mapped_as_dataclass
+class ProductImageVariant:
+    __tablename__ = 'product_image_variants'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    image_id: Mapped[int] = mapped_column(
+        ForeignKey('product_images.id', ondelete='CASCADE'), index=True
+    )
+    kind: Mapped[str]
+    file_name: Mapped[str]
+    file_type: Mapped[str]
+    width: Mapped[int]
+    height: Mapped[int]
+    content_hash: Mapped[str] = mapped_column(index=True)
+    image: Mapped[ProductImage] = relationship(
+        init=False, back_populates='variants'
+    )
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
     )
+
+
+# Smallest rendition of the product's first image, for catalog listings.
+Product.__mapper__.add_property(
+    'thumbnail',
+    column_property(
+        select(ProductImageVariant.file_name)
+        .join(ProductImage, ProductImage.id == ProductImageVariant.image_id)
+        .where(
+            ProductImage.product_id == Product.id,
+            ProductImageVariant.kind == 'thumbnail',
+        )
+        .order_by(ProductImage.id)
+        .limit(1)
+        .scalar_subquery()
+    ),
+)
+
+
+@table_registry.mapped_as_dataclass
+class RevokedPrincipal:
+    __tablename__ = 'revoked_principals'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    user_id: Mapped[int] = mapped_column(index=True)
+    created_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), index=True
+    )
@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import date, datetime
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from fast_zero.settings import Settings
+
+settings = Settings()
+MAX_PAGE_SIZE = settings.MAX_PAGE_SIZE
+
+
+def page_size(limit: int | None):
+    return limit or settings.DEFAULT_PAGE_SIZE
+
+
+def encode_cursor(values):
+    raw = json.dumps(
+        [
+            value.isoformat() if isinstance(value, date) else value
+            for value in values
+        ],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value)
+            if column.type.python_type is datetime
+            else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor.'
+        )
+
+
+def keyset(query, columns, cursor=None, descending=False):
+    """Order ``query`` by ``columns`` and resume it after ``cursor``."""
+    if descending:
+        query = query.order_by(*(column.desc() for column in columns))
+    else:
+        query = query.order_by(*columns)
+
+    if cursor:
+        key, values = tuple_(*columns), tuple_(*decode_cursor(cursor, columns))
+        query = query.where(key < values if descending else key > values)
+
+    return query
+
+
+def paginate(  # noqa: PLR0913
+    query, columns, *, cursor=None, offset=None, limit=None, descending=False
+):
+    """Order ``query`` by ``columns`` and apply keyset or offset paging.
+
+    One extra row is fetched so ``next_page`` can tell whether another
+    page exists.
+    """
+    query = keyset(query, columns, cursor, descending)
+    return query.offset(offset).limit(page_size(limit) + 1)
+
+
+def next_page(rows, columns, limit=None):
+    size = page_size(limit)
+    if len(rows) <= size:
+        return rows, None
+
+    rows = rows[:size]
+    return rows, encode_cursor(
+        getattr(rows[-1], column.key) for column in columns
+    )
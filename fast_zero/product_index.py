@@ -0,0 +1,474 @@
+import asyncio
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select
+
+from fast_zero.models import Product
+from fast_zero.pagination import decode_cursor
+from fast_zero.settings import Settings
+from fast_zero.states import CategoryState
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the index needs NumPy
+    np = None
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+CATEGORIES = {
+    category.name: code for code, category in enumerate(CategoryState)
+}
+# Array name and dtype for each indexed column, plus the live flag.
+ARRAYS = {
+    'ids': 'int64',
+    'valor': 'float64',
+    'categoria': 'int8',
+    'estoque': 'int64',
+    'live': 'bool',
+}
+COLUMNS = (
+    Product.id,
+    Product.valor,
+    Product.categoria,
+    Product.estoque_inicial,
+)
+SORTS = ('id', 'valor')
+# Rows checked against the filters at a time while walking an order.
+SCAN_CHUNK = 4096
+
+
+def by_ids(ids):
+    """``id = ANY(:ids)``: one array parameter rather than one per id."""
+    return Product.id == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
+
+
+def build_order(sort: str, ids, valor):
+    """Rows in ascending ``sort`` order, and their keys in that order."""
+    if sort == 'id':
+        if np.all(ids[1:] > ids[:-1]):
+            order = np.arange(len(ids))
+        else:
+            order = np.argsort(ids)
+        return order, (ids[order],)
+
+    order = np.lexsort((ids, valor))
+    return order, (valor[order], ids[order])
+
+
+class ProductIndex:
+    """``Product`` columns held in NumPy arrays to pick list pages.
+
+    ``page`` answers the ``list_products`` filters and returns only the
+    ids of the page; the rows themselves still come from the database by
+    primary key, so bodies are never stale.
+
+    Each sort keeps the rows in its order. A page seeks to its cursor
+    with ``searchsorted`` and checks the filters a chunk at a time until
+    it has enough rows, so early pages only look at a prefix. Writes
+    that move rows drop the order and it is rebuilt on a worker thread;
+    meanwhile pages mask the whole index and partition out their rows.
+
+    Writes update the arrays in place, deleted rows are masked out
+    until enough pile up to compact. A write that lands while ``load``
+    is reading the table is replayed on top of the new arrays; ``load``
+    and ``refresh`` take turns, so neither applies rows read before the
+    other's. ``invalidate`` marks the whole index stale and reloads it
+    once the invalidations stop arriving for ``reload_delay`` seconds;
+    meanwhile pages fall back to SQL.
+    """
+
+    def __init__(self, enabled: bool = True, reload_delay: float = 1):
+        self.enabled = enabled and np is not None
+        self.reload_delay = reload_delay
+        self.loaded = False
+        self.stale = False
+        self.invalidations = 0
+        self.loads = 0
+        self.answered = 0
+        self.scanned = 0
+        self.fallbacks = 0
+        self.version = 0
+        self.orders = {}
+        self._pending = None
+        self._lock = asyncio.Lock()
+        self._reload = None
+        self._building = {}
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        self.size = 0
+        self.deleted = 0
+        self.rows = {}
+        self._reorder()
+        for name, dtype in ARRAYS.items():
+            setattr(self, name, np and np.zeros(capacity, dtype=dtype))
+
+    def _reorder(self, *sorts: str):
+        """Drop the ``sorts`` orders (all by default), including any
+        being built from the old rows."""
+        for sort in sorts or SORTS:
+            self.orders.pop(sort, None)
+        self.version += 1
+
+    def _grow(self):
+        capacity = max(2 * len(self.ids), 1024)
+        for name, dtype in ARRAYS.items():
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, grown)
+
+    def _set(self, row: int, values):
+        id, valor, categoria, estoque_inicial = values
+        self.ids[row] = id
+        self.valor[row] = valor
+        self.categoria[row] = CATEGORIES[getattr(categoria, 'name', categoria)]
+        self.estoque[row] = estoque_inicial
+        self.live[row] = True
+
+    def load_rows(self, rows):
+        """Replace the index with ``rows`` of ``COLUMNS`` values."""
+        rows = list(rows)
+        self._reset(len(rows))
+        if rows:
+            ids, valor, categoria, estoque = zip(*rows)
+            self.ids[:] = ids
+            self.valor[:] = valor
+            self.categoria[:] = [
+                CATEGORIES[getattr(value, 'name', value)] for value in categoria
+            ]
+            self.estoque[:] = estoque
+            self.live[:] = True
+            self.size = len(rows)
+            self.rows = {id: row for row, id in enumerate(ids)}
+        self.loaded = True
+        self.loads += 1
+
+    async def load(self, session_factory):
+        async with self._lock:
+            self._pending = []
+            try:
+                async with session_factory() as session:
+                    rows = (
+                        await session.execute(
+                            select(*COLUMNS).order_by(Product.id)
+                        )
+                    ).all()
+                pending, self._pending = self._pending, None
+                self.load_rows(rows)
+                for method, args in pending:
+                    method(*args)
+            finally:
+                self._pending = None
+        await asyncio.gather(*(self.build(sort) for sort in SORTS))
+
+    async def refresh(self, session_factory, *ids: int):
+        """Reread ``ids``, e.g. after a write on another node."""
+        if not self.loaded or not ids:
+            return
+        async with self._lock:
+            async with session_factory() as session:
+                rows = (
+                    await session.execute(select(*COLUMNS).where(by_ids(ids)))
+                ).all()
+            for values in rows:
+                self.upsert(values)
+            self.remove(*(set(ids) - {values[0] for values in rows}))
+
+    def invalidate(self, session_factory):
+        """Mark the index stale and schedule one debounced reload."""
+        self.stale = True
+        self.invalidations += 1
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.get_running_loop().create_task(
+                self._reload_when_quiet(session_factory)
+            )
+
+    async def _reload_when_quiet(self, session_factory):
+        try:
+            seen = None
+            while seen != self.invalidations:
+                seen = self.invalidations
+                await asyncio.sleep(self.reload_delay)
+                if seen == self.invalidations:
+                    await self.load(session_factory)
+            self.stale = False
+        except Exception:
+            logger.exception('Reloading the product index failed')
+
+    def build_orders(self):
+        """Build the missing orders right away, on this thread."""
+        for sort in SORTS:
+            if sort not in self.orders:
+                self.orders[sort] = build_order(
+                    sort, self.ids[: self.size], self.valor[: self.size]
+                )
+
+    async def build(self, sort: str):
+        """Build the ``sort`` order on a worker thread, from a copy of
+        the arrays; it is kept only if no write moved rows meanwhile."""
+        version = self.version
+        if sort in self.orders or self._building.get(sort) == version:
+            return
+        self._building[sort] = version
+        try:
+            order = await run_in_threadpool(
+                build_order,
+                sort,
+                self.ids[: self.size].copy(),
+                self.valor[: self.size].copy(),
+            )
+        finally:
+            if self._building.get(sort) == version:
+                del self._building[sort]
+        if version == self.version:
+            self.orders[sort] = order
+
+    def _schedule_build(self, sort: str):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to hand it to (e.g. a script): build now.
+            self.build_orders()
+            return
+        task = loop.create_task(self.build(sort))
+        _builds.add(task)
+        task.add_done_callback(_builds.discard)
+
+    def _upsert(self, values):
+        id, valor = values[0], values[1]
+        row = self.rows.get(id)
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.rows[id] = self.size
+            self.size += 1
+            self._append_to_id_order(row, id)
+        elif self.valor[row] != valor:
+            self._reorder('valor')
+        self._set(row, values)
+
+    def _append_to_id_order(self, row: int, id: int):
+        # New products get the highest id, so they simply go last.
+        order = self.orders.get('id')
+        if order is None or (len(order[0]) and order[1][0][-1] >= id):
+            self._reorder('id', 'valor')
+            return
+        self._reorder('valor')
+        rows, (ids,) = order
+        self.orders['id'] = (np.append(rows, row), (np.append(ids, id),))
+
+    def upsert(self, values):
+        if self._pending is not None:
+            self._pending.append((self.upsert, (values,)))
+        if self.loaded:
+            self._upsert(values)
+
+    def upsert_product(self, product, id: int | None = None):
+        """Index a ``Product`` or schema; ``id`` for one that has none."""
+        self.upsert((
+            product.id if id is None else id,
+            *(getattr(product, column.key) for column in COLUMNS[1:]),
+        ))
+
+    def remove(self, *ids: int):
+        if self._pending is not None:
+            self._pending.append((self.remove, ids))
+        for id in ids:
+            row = self.rows.pop(id, None)
+            if row is not None:
+                self.live[row] = False
+                self.deleted += 1
+        if self.deleted > self.size // 2:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.live[: self.size])
+        for name in ARRAYS:
+            setattr(self, name, getattr(self, name)[keep].copy())
+        self.size = len(keep)
+        self.deleted = 0
+        self.rows = {int(id): row for row, id in enumerate(self.ids)}
+        self._reorder()
+
+    def mask(  # noqa: PLR0913
+        self,
+        rows=None,
+        *,
+        valor: float | None = None,
+        valor_min: float | None = None,
+        valor_max: float | None = None,
+        categoria: str | None = None,
+        disponivel: bool = False,
+    ):
+        """Which of ``rows`` (all by default) match the filters, as in
+        ``filter_products``."""
+        rows = slice(0, self.size) if rows is None else rows
+        mask = self.live[rows].copy()
+        if disponivel:
+            mask &= self.estoque[rows] > 0
+        if categoria:
+            mask &= self.categoria[rows] == CATEGORIES[categoria]
+        if valor is not None:
+            mask &= self.valor[rows] == valor
+        if valor_min is not None:
+            mask &= self.valor[rows] >= valor_min
+        if valor_max is not None:
+            mask &= self.valor[rows] <= valor_max
+        return mask
+
+    def page(self, params: dict):
+        """Ids of the ``list_products`` page for ``params``, plus one.
+
+        ``None`` when the index can't answer, so the caller falls back
+        to SQL: not loaded, stale, a text filter or an unknown category.
+        """
+        current = self.loaded and not self.stale
+        if (
+            not current
+            or params['descricao']
+            or params['search']
+            or (params['categoria'] and params['categoria'] not in CATEGORIES)
+        ):
+            self.fallbacks += 1
+            return None
+
+        filters = {
+            'valor': params['valor'],
+            'valor_min': params['valor_min'],
+            'valor_max': params['valor_max'],
+            'categoria': params['categoria'],
+            'disponivel': params['disponivel'],
+        }
+        sort = params['sort'].lstrip('-')
+        descending = params['sort'].startswith('-')
+        after = None
+        if params['cursor']:
+            after = decode_cursor(
+                params['cursor'],
+                (Product.valor, Product.id)
+                if sort == 'valor'
+                else (Product.id,),
+            )
+        start = params['offset'] or 0
+        end = start + params['limit'] + 1
+
+        if sort not in self.orders:
+            self._schedule_build(sort)
+        if sort in self.orders:
+            rows = self._scan(sort, descending, after, filters, end)
+        else:
+            rows = self._partition(sort, descending, after, filters, end)
+        self.answered += 1
+        return self.ids[rows[start:end]].tolist()
+
+    def _scan(self, sort, descending, after, filters, end):  # noqa: PLR0913
+        """The first ``end`` matching rows, walking the ``sort`` order
+        from the cursor."""
+        order, keys = self.orders[sort]
+        # Only rows inside the valor bounds can match; in the valor order
+        # those are one slice.
+        first, last = 0, len(order)
+        if sort == 'valor':
+            low, high = filters['valor_min'], filters['valor_max']
+            if filters['valor'] is not None:
+                low = high = filters['valor']
+            if low is not None:
+                first = np.searchsorted(keys[0], low, side='left')
+            if high is not None:
+                last = np.searchsorted(keys[0], high, side='right')
+
+        side = 'left' if descending else 'right'
+        if after is None:
+            position = last if descending else first
+        elif sort == 'id':
+            position = np.searchsorted(keys[0], after[0], side=side)
+        else:
+            # Within the rows tied on valor, seek on the id tiebreak.
+            low = np.searchsorted(keys[0], after[0], side='left')
+            high = np.searchsorted(keys[0], after[0], side='right')
+            position = low + np.searchsorted(
+                keys[1][low:high], after[1], side=side
+            )
+        position = min(max(position, first), last)
+
+        found, count = [], 0
+        while count < end:
+            if descending:
+                chunk = order[max(position - SCAN_CHUNK, first) : position]
+                chunk = chunk[::-1]
+                position -= len(chunk)
+            else:
+                chunk = order[position : min(position + SCAN_CHUNK, last)]
+                position += len(chunk)
+            if not len(chunk):
+                break
+            self.scanned += len(chunk)
+            chunk = chunk[self.mask(chunk, **filters)]
+            found.append(chunk)
+            count += len(chunk)
+        return np.concatenate(found) if found else np.zeros(0, dtype=int)
+
+    def _partition(self, sort, descending, after, filters, end):  # noqa: PLR0913
+        """All matching rows, sorted only as far as the first ``end``."""
+        mask = self.mask(**filters)
+        ids, valor = self.ids[: self.size], self.valor[: self.size]
+        if after and sort == 'valor':
+            after_valor, after_id = after
+            if descending:
+                mask &= (valor < after_valor) | (
+                    (valor == after_valor) & (ids < after_id)
+                )
+            else:
+                mask &= (valor > after_valor) | (
+                    (valor == after_valor) & (ids > after_id)
+                )
+        elif after:
+            (after_id,) = after
+            mask &= ids < after_id if descending else ids > after_id
+        self.scanned += self.size
+
+        # Sort keys ascending either way: negating both columns turns
+        # ``valor DESC, id DESC`` into an ascending order too.
+        selected = np.flatnonzero(mask)
+        primary = valor[selected] if sort == 'valor' else ids[selected]
+        tiebreak = ids[selected]
+        if descending:
+            primary, tiebreak = -primary, -tiebreak
+
+        # Partition around the ``end``-th key and sort what falls before.
+        if end < len(selected):
+            kth = np.partition(primary, end - 1)[end - 1]
+            keep = primary <= kth
+            selected, primary, tiebreak = (
+                selected[keep],
+                primary[keep],
+                tiebreak[keep],
+            )
+        return selected[np.lexsort((tiebreak, primary))]
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'loaded': self.loaded,
+            'stale': self.stale,
+            'products': len(self.rows),
+            'orders': sorted(self.orders),
+            'bytes': sum(getattr(self, name).nbytes for name in ARRAYS)
+            if self.enabled
+            else 0,
+            'loads': self.loads,
+            'invalidations': self.invalidations,
+            'answered': self.answered,
+            'scanned': self.scanned,
+            'fallbacks': self.fallbacks,
+        }
+
+
+# Order builds in flight, so they aren't garbage collected midway.
+_builds = set()
+product_index = ProductIndex(
+    enabled=settings.PRODUCT_INDEX,
+    reload_delay=settings.PRODUCT_INDEX_RELOAD_DELAY_SECONDS,
+)
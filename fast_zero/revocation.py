@@ -0,0 +1,87 @@
+import time
+from datetime import timedelta
+from hashlib import blake2b
+
+from sqlalchemy import func, select
+
+from fast_zero.models import RevokedPrincipal
+
+
+class RevocationFilter:
+    """Bloom filter of user ids whose signed claims can't be trusted.
+
+    A hit only means "maybe revoked": callers fall back to loading the
+    user from the database. The filter is rebuilt from
+    ``revoked_principals`` every ``refresh_seconds``, keeping only rows
+    young enough to still have live tokens.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        hashes: int,
+        refresh_seconds: float,
+        retention: timedelta,
+    ):
+        self.size = size
+        self.hashes = hashes
+        self.refresh_seconds = refresh_seconds
+        self.retention = retention
+        self.refreshed_at = None
+        self._bits = bytearray((size + 7) // 8)
+        self._local = set()
+
+    def _positions(self, user_id: int):
+        digest = blake2b(
+            str(user_id).encode(), digest_size=4 * self.hashes
+        ).digest()
+        for index in range(self.hashes):
+            chunk = digest[4 * index : 4 * (index + 1)]
+            yield int.from_bytes(chunk, 'big') % self.size
+
+    def _set(self, bits: bytearray, user_id: int):
+        for position in self._positions(user_id):
+            bits[position // 8] |= 1 << (position % 8)
+
+    def add(self, user_id: int):
+        self._set(self._bits, user_id)
+        self._local.add(user_id)
+
+    def __contains__(self, user_id: int):
+        return all(
+            self._bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(user_id)
+        )
+
+    def clear(self):
+        self._bits = bytearray(len(self._bits))
+        self._local.clear()
+        self.expire()
+
+    def expire(self):
+        """Rebuild from the database on the next check."""
+        self.refreshed_at = None
+
+    def is_stale(self):
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_seconds
+        )
+
+    async def refresh(self, session):
+        self.refreshed_at = time.monotonic()
+        local = set(self._local)
+        user_ids = (
+            await session.scalars(
+                select(RevokedPrincipal.user_id).where(
+                    RevokedPrincipal.created_at >= func.now() - self.retention
+                )
+            )
+        ).all()
+
+        bits = bytearray(len(self._bits))
+        for user_id in {*user_ids, *self._local}:
+            self._set(bits, user_id)
+        self._bits = bits
+        # ids revoked on this node while the query ran stay in the filter
+        self._local -= local
@@ -4,28 +4,31 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fast_zero.database import get_session
 from fast_zero.models import User
-from fast_zero.schemas import Token
+from fast_zero.schemas import Principal, Token
 from fast_zero.security import (
     create_access_token,
     get_current_user,
-    verify_password,
+    hashing_pool,
+    principal_claims,
 )
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
-Session = Annotated[Session, Depends(get_session)]
+Session = Annotated[AsyncSession, Depends(get_session)]
 
 
 @router.post('/token', response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     session: Session,
     form_data: OAuth2PasswordRequestForm = Depends(),
 ):
-    user = session.scalar(select(User).where(User.email == form_data.username))
+    user = await session.scalar(
+        select(User).where(User.email == form_data.username)
+    )
 
     if not user:
         raise HTTPException(
@@ -33,21 +36,21 @@ def login_for_access_token(
             detail='Incorrect email or password',
         )
 
-    if not verify_password(form_data.password, user.password):
+    if not await hashing_pool.verify(form_data.password, user.password):
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail='Incorrect email or password',
         )
 
-    access_token = create_access_token(data={'sub': user.email})
+    access_token = create_access_token(data=principal_claims(user))
 
     return {'access_token': access_token, 'token_type': 'bearer'}
 
 
 @router.post('/refresh_token', response_model=Token)
-def refresh_access_token(
-    user: User = Depends(get_current_user),
+async def refresh_access_token(
+    user: Principal = Depends(get_current_user),
 ):
-    new_access_token = create_access_token(data={'sub': user.email})
+    new_access_token = create_access_token(data=principal_claims(user))
 
     return {'access_token': new_access_token, 'token_type': 'bearer'}
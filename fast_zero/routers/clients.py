@@ -1,29 +1,60 @@
+from collections.abc import Callable
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-
-from fast_zero.database import get_session
-from fast_zero.models import Client, User
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero.bulk import RowErrors, validated_chunks
+from fast_zero.conditional import make_etag, not_modified, page_etag
+from fast_zero.database import get_session, get_session_factory
+from fast_zero.models import Client
+from fast_zero.pagination import (
+    MAX_PAGE_SIZE,
+    keyset,
+    next_page,
+    page_size,
+    paginate,
+)
 from fast_zero.schemas import (
+    ClientBulkResult,
     ClientList,
     ClientPublic,
     ClientSchema,
     ClientUpdate,
     Message,
+    Principal,
 )
+from fast_zero.search import SearchFields, trigram_search
 from fast_zero.security import RoleChecker, get_current_user
+from fast_zero.streaming import ndjson_response, wants_ndjson
 
-Session = Annotated[Session, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+Session = Annotated[AsyncSession, Depends(get_session)]
+SessionFactory = Annotated[Callable, Depends(get_session_factory)]
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
 router = APIRouter(prefix='/clients', tags=['clients'])
 
+CLIENT_SEARCH = SearchFields(
+    (Client.nome_completo, Client.cpf, Client.email), Client.id
+)
+
+
+def client_version(client: Client):
+    return (client.id, client.updated_at)
+
 
 @router.post('/', response_model=ClientPublic)
-def create_client(
+async def create_client(
     client: ClientSchema,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
@@ -34,20 +65,67 @@ def create_client(
         email=client.email,
     )
     session.add(db_client)
-    session.commit()
-    session.refresh(db_client)
+    await session.commit()
+    await session.refresh(db_client)
 
     return db_client
 
 
+@router.post('/bulk', response_model=ClientBulkResult)
+async def upsert_clients_bulk(
+    request: Request,
+    session: Session,
+    _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
+):
+    inserted, updated, errors = 0, 0, RowErrors()
+
+    async for chunk in validated_chunks(request, ClientSchema, errors):
+        # One statement can't touch the same row twice, so the last
+        # occurrence of an email in the chunk wins.
+        rows = {
+            client.email: client.model_dump(
+                include={'nome_completo', 'cpf', 'email'}
+            )
+            for _, client in chunk
+        }
+        updated += len(chunk) - len(rows)
+
+        statement = insert(Client).values(list(rows.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=[Client.email],
+            set_={
+                'nome_completo': statement.excluded.nome_completo,
+                'cpf': statement.excluded.cpf,
+                'updated_at': func.now(),
+            },
+        ).returning(literal_column('(xmax = 0)'))
+
+        created = (await session.execute(statement)).scalars().all()
+        await session.commit()
+        inserted += sum(created)
+        updated += len(created) - sum(created)
+
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'errors': errors.rows,
+        'error_count': errors.count,
+    }
+
+
 @router.get('/', response_model=ClientList)
-def list_clients(  # noqa
+async def list_clients(  # noqa
+    request: Request,
+    response: Response,
     session: Session,
+    open_session: SessionFactory,
     nome_completo: str = Query(None),
     cpf: str = Query(None),
     email: str = Query(None),
-    offset: int = Query(None),
-    limit: int = Query(None),
+    search: str = Query(None, min_length=1),
+    cursor: str = Query(None),
+    offset: int = Query(None, ge=0),
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
     current_user: CurrentUser = None,
 ):
     query = select(Client)
@@ -61,32 +139,81 @@ def list_clients(  # noqa
     if email:
         query = query.filter(Client.email == email)
 
-    clients = session.scalars(query.offset(offset).limit(limit)).all()
+    if search:
+        if cursor:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail='Search results are paged with offset, not cursor.',
+            )
+        query = await trigram_search.apply(
+            session, query, fields=CLIENT_SEARCH, term=search
+        )
+        clients = (
+            await session.scalars(query.offset(offset).limit(page_size(limit)))
+        ).all()
+
+        if cached := not_modified(
+            request, response, page_etag(clients, client_version)
+        ):
+            return cached
+
+        return {'clients': clients}
+
+    columns = (Client.id,)
+    if wants_ndjson(request):
+        query = keyset(query, columns, cursor)
+        return ndjson_response(
+            open_session, query.offset(offset).limit(limit), ClientPublic
+        )
+
+    query = paginate(query, columns, cursor=cursor, offset=offset, limit=limit)
+    clients, next_cursor = next_page(
+        (await session.scalars(query)).all(), columns, limit
+    )
+
+    if cached := not_modified(
+        request, response, page_etag(clients, client_version, next_cursor)
+    ):
+        return cached
 
-    return {'clients': clients}
+    return {'clients': clients, 'next_cursor': next_cursor}
 
 
 @router.get('/{id}', response_model=ClientPublic)
-def show_client(  # noqa
+async def show_client(  # noqa
     id: int,
+    request: Request,
+    response: Response,
     session: Session,
     current_user: CurrentUser = None,
 ):
-    client: Client = session.scalars(
-        select(Client).filter(Client.id == id)
+    client: Client = (
+        await session.scalars(select(Client).filter(Client.id == id))
     ).first()
 
+    if client and (
+        cached := not_modified(
+            request,
+            response,
+            make_etag(*client_version(client)),
+            client.updated_at,
+        )
+    ):
+        return cached
+
     return client
 
 
 @router.put('/{client_id}', response_model=ClientPublic)
-def update_client(
+async def update_client(
     client_id: int,
     session: Session,
     client: ClientUpdate,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    db_client = session.scalar(select(Client).where(Client.id == client_id))
+    db_client = await session.scalar(
+        select(Client).where(Client.id == client_id)
+    )
 
     if not db_client:
         raise HTTPException(
@@ -97,26 +224,26 @@ def update_client(
         setattr(db_client, key, value)
 
     session.add(db_client)
-    session.commit()
-    session.refresh(db_client)
+    await session.commit()
+    await session.refresh(db_client)
 
     return db_client
 
 
 @router.delete('/{client_id}', response_model=Message)
-def delete_client(
+async def delete_client(
     client_id: int,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    client = session.scalar(select(Client).where(Client.id == client_id))
+    client = await session.scalar(select(Client).where(Client.id == client_id))
 
     if not client:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Client not found.'
         )
 
-    session.delete(client)
-    session.commit()
+    await session.delete(client)
+    await session.commit()
 
     return {'message': 'Client has been deleted successfully.'}
@@ -0,0 +1,119 @@
+from collections.abc import Callable
+from datetime import date
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+)
+from sqlalchemy import select
+
+from fast_zero.database import get_session_factory
+from fast_zero.exports import export_runner, settings
+from fast_zero.models import Client, Order, OrderProduct, Product
+from fast_zero.routers.orders import filter_orders
+from fast_zero.schemas import ExportJobPublic
+from fast_zero.security import RoleChecker
+from fast_zero.streaming import file_response
+
+SessionFactory = Annotated[Callable, Depends(get_session_factory)]
+AdminOnly = Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))]
+
+router = APIRouter(prefix='/exports', tags=['exports'])
+
+
+def order_lines():
+    """One row per order line, with the client and product alongside."""
+    return (
+        select(
+            Order.id.label('order_id'),
+            Order.created_at,
+            Order.state,
+            Client.id.label('client_id'),
+            Client.nome_completo.label('client_nome_completo'),
+            Client.email.label('client_email'),
+            Client.cpf.label('client_cpf'),
+            Product.id.label('product_id'),
+            Product.descricao.label('product_descricao'),
+            Product.secao.label('product_secao'),
+            Product.categoria.label('product_categoria'),
+            Product.valor.label('product_valor'),
+        )
+        .join(Client, Client.id == Order.client_id)
+        .outerjoin(OrderProduct, OrderProduct.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderProduct.product_id)
+        .order_by(Order.id, Product.id)
+    )
+
+
+def get_job(job_id: str):
+    job = export_runner.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Export not found.'
+        )
+    return job
+
+
+@router.post(
+    '/orders',
+    status_code=HTTPStatus.ACCEPTED,
+    response_model=ExportJobPublic,
+)
+async def export_orders(  # noqa
+    background_tasks: BackgroundTasks,
+    open_session: SessionFactory,
+    _: AdminOnly,
+    created_start: date = Query(None),
+    created_end: date = Query(None),
+    product_secao: str = Query(None),
+    order_id: int = Query(None),
+    state: str = Query(None),
+    client_id: int = Query(None),
+):
+    query = filter_orders(
+        order_lines(),
+        created_start=created_start,
+        created_end=created_end,
+        product_secao=product_secao,
+        order_id=order_id,
+        state=state,
+        client_id=client_id,
+    )
+
+    await export_runner.prune()
+    job = export_runner.submit(settings.EXPORT_DIR)
+    background_tasks.add_task(export_runner.run, job, open_session, query)
+
+    return job
+
+
+@router.get('/{job_id}', response_model=ExportJobPublic)
+async def show_export(job_id: str, _: AdminOnly):
+    return get_job(job_id)
+
+
+@router.get('/{job_id}/download')
+async def download_export(job_id: str, request: Request, _: AdminOnly):
+    job = get_job(job_id)
+
+    if job.state != 'done':
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT, detail='Export is not ready.'
+        )
+
+    return file_response(
+        request,
+        job.path,
+        'application/gzip',
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename="orders-{job.id}.csv.gz"'
+            )
+        },
+    )
@@ -0,0 +1,28 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from fast_zero.catalog import catalog_cache
+from fast_zero.exports import export_runner
+from fast_zero.images import variant_pool
+from fast_zero.invalidation import invalidation_bus
+from fast_zero.product_index import product_index
+from fast_zero.security import RoleChecker, hashing_pool, principal_cache
+
+router = APIRouter(prefix='/metrics', tags=['metrics'])
+
+
+@router.get('/')
+async def show_metrics(
+    _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
+):
+    return {
+        'principal_cache': principal_cache.stats(),
+        'password_hashing': hashing_pool.stats(),
+        'exports': export_runner.stats(),
+        'image_variants': variant_pool.stats(),
+        'catalog_cache': await catalog_cache.stats(),
+        'request_coalescing': catalog_cache.flights.stats(),
+        'product_index': product_index.stats(),
+        'cache_invalidation': invalidation_bus.stats(),
+    }
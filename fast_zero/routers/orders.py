@@ -1,38 +1,57 @@
-from datetime import datetime
+from collections.abc import Callable
+from datetime import date, datetime, time, timedelta
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import and_, func, select
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fast_zero.database import get_session
-from fast_zero.models import Order, OrderProduct, Product, User
+from fast_zero.conditional import make_etag, not_modified, page_etag
+from fast_zero.database import get_session, get_session_factory
+from fast_zero.models import Order, OrderProduct, Product
+from fast_zero.pagination import MAX_PAGE_SIZE, keyset, next_page, paginate
 from fast_zero.schemas import (
     Message,
     OrderList,
     OrderPublic,
     OrderSchema,
     OrderUpdate,
+    Principal,
 )
 from fast_zero.security import RoleChecker, get_current_user
+from fast_zero.streaming import ndjson_response, wants_ndjson
 
 router = APIRouter()
 
-Session = Annotated[Session, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+Session = Annotated[AsyncSession, Depends(get_session)]
+SessionFactory = Annotated[Callable, Depends(get_session_factory)]
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
 router = APIRouter(prefix='/orders', tags=['orders'])
 
 
+def order_version(order: Order):
+    return (order.id, order.updated_at)
+
+
 @router.post('/', response_model=OrderPublic)
-def create_order(
+async def create_order(
     order: OrderSchema,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    products = session.scalars(
-        select(Product).where(Product.id.in_(order.product_ids))
+    products = (
+        await session.scalars(
+            select(Product).where(Product.id.in_(order.product_ids))
+        )
     ).all()
 
     db_order: Order = Order(
@@ -42,44 +61,45 @@ def create_order(
     db_order.products = products
     session.add(db_order)
     session.add_all([db_order] + products)
-    session.commit()
-    session.refresh(db_order)
+    await session.commit()
+    await session.refresh(db_order)
 
     return db_order
 
 
-@router.get('/', response_model=OrderList)
-def list_orders(  # noqa
-    session: Session,
-    created_start: str = Query(None),
-    created_end: str = Query(None),
-    product_secao: str = Query(None),
-    order_id: int = Query(None),
-    state: str = Query(None),
-    client_id: int = Query(None),
-    offset: int = Query(None),
-    limit: int = Query(None),
-    current_user: CurrentUser = None,
+def filter_orders(  # noqa
+    query,
+    created_start: date | None = None,
+    created_end: date | None = None,
+    product_secao: str | None = None,
+    order_id: int | None = None,
+    state: str | None = None,
+    client_id: int | None = None,
 ):
-    query = select(Order)
-
-    if created_start and created_end:
-        created_start_format = datetime.strptime(
-            f'{created_start} 00:00:00', '%Y-%m-%d %H:%M:%S'
-        )
-        created_end_format = datetime.strptime(
-            f'{created_end} 23:59:59', '%Y-%m-%d %H:%M:%S'
+    # Half-open [start, end + 1 day) range on the raw column so the
+    # created_at indexes stay usable.
+    if created_start:
+        query = query.filter(
+            Order.created_at >= datetime.combine(created_start, time.min)
         )
+
+    if created_end:
         query = query.filter(
-            and_(func.date(Order.created_at) >= created_start_format),
-            func.date(Order.created_at) <= created_end_format,
+            Order.created_at
+            < datetime.combine(created_end + timedelta(days=1), time.min)
         )
 
     if product_secao:
-        query = (
-            query.join(OrderProduct, OrderProduct.order_id == Order.id)
+        # Semi-join: one row per order however many products match.
+        query = query.filter(
+            select(OrderProduct.order_id)
             .join(Product, Product.id == OrderProduct.product_id)
-            .filter(Product.secao == product_secao)
+            .where(
+                OrderProduct.order_id == Order.id,
+                Product.secao == product_secao,
+            )
+            .correlate(Order)
+            .exists()
         )
 
     if order_id:
@@ -91,30 +111,89 @@ def list_orders(  # noqa
     if client_id:
         query = query.filter(Order.client_id == client_id)
 
-    orders = session.scalars(query.offset(offset).limit(limit)).all()
+    return query
 
-    return {'orders': orders}
+
+@router.get('/', response_model=OrderList)
+async def list_orders(  # noqa
+    request: Request,
+    response: Response,
+    session: Session,
+    open_session: SessionFactory,
+    created_start: date = Query(None),
+    created_end: date = Query(None),
+    product_secao: str = Query(None),
+    order_id: int = Query(None),
+    state: str = Query(None),
+    client_id: int = Query(None),
+    cursor: str = Query(None),
+    offset: int = Query(None, ge=0),
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: CurrentUser = None,
+):
+    query = filter_orders(
+        select(Order),
+        created_start=created_start,
+        created_end=created_end,
+        product_secao=product_secao,
+        order_id=order_id,
+        state=state,
+        client_id=client_id,
+    )
+
+    columns = (Order.created_at, Order.id)
+    if wants_ndjson(request):
+        query = keyset(query, columns, cursor)
+        return ndjson_response(
+            open_session, query.offset(offset).limit(limit), OrderPublic
+        )
+
+    query = paginate(query, columns, cursor=cursor, offset=offset, limit=limit)
+    orders, next_cursor = next_page(
+        (await session.scalars(query)).all(), columns, limit
+    )
+
+    if cached := not_modified(
+        request, response, page_etag(orders, order_version, next_cursor)
+    ):
+        return cached
+
+    return {'orders': orders, 'next_cursor': next_cursor}
 
 
 @router.get('/{id}', response_model=OrderPublic)
-def show_order(  # noqa
+async def show_order(  # noqa
     id: int,
+    request: Request,
+    response: Response,
     session: Session,
     current_user: CurrentUser = None,
 ):
-    order: Order = session.scalars(select(Order).filter(Order.id == id)).first()
+    order: Order = (
+        await session.scalars(select(Order).filter(Order.id == id))
+    ).first()
+
+    if order and (
+        cached := not_modified(
+            request,
+            response,
+            make_etag(*order_version(order)),
+            order.updated_at,
+        )
+    ):
+        return cached
 
     return order
 
 
 @router.patch('/{order_id}', response_model=OrderPublic)
-def patch_order(
+async def patch_order(
     order_id: int,
     session: Session,
     order: OrderUpdate,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    db_order = session.scalar(select(Order).where(Order.id == order_id))
+    db_order = await session.scalar(select(Order).where(Order.id == order_id))
 
     if not db_order:
         raise HTTPException(
@@ -125,26 +204,26 @@ def patch_order(
         setattr(db_order, key, value)
 
     session.add(db_order)
-    session.commit()
-    session.refresh(db_order)
+    await session.commit()
+    await session.refresh(db_order)
 
     return db_order
 
 
 @router.delete('/{order_id}', response_model=Message)
-def delete_order(
+async def delete_order(
     order_id: int,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    order = session.scalar(select(Order).where(Order.id == order_id))
+    order = await session.scalar(select(Order).where(Order.id == order_id))
 
     if not order:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Order not found.'
         )
 
-    session.delete(order)
-    session.commit()
+    await session.delete(order)
+    await session.commit()
 
     return {'message': 'Order has been deleted successfully.'}
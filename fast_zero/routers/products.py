@@ -1,33 +1,98 @@
-import os
-import uuid
+from collections.abc import Callable
 from http import HTTPStatus
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
-from sqlalchemy import String, cast, select
-from sqlalchemy.orm import Session
-
-from fast_zero.database import get_session
-from fast_zero.models import Product, ProductImage, User
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero.bulk import RowErrors, validated_chunks
+from fast_zero.catalog import catalog_cache
+from fast_zero.conditional import make_etag, page_etag
+from fast_zero.database import get_session, get_session_factory
+from fast_zero.images import (
+    image_path,
+    lock_blobs,
+    place_blob,
+    remove_images,
+    remove_orphans,
+    store_upload,
+    variant_pool,
+)
+from fast_zero.invalidation import invalidation_bus
+from fast_zero.models import Product, ProductImage, ProductImageVariant
+from fast_zero.pagination import (
+    MAX_PAGE_SIZE,
+    keyset,
+    next_page,
+    page_size,
+    paginate,
+)
+from fast_zero.product_index import by_ids, product_index
 from fast_zero.schemas import (
+    BulkResult,
     Message,
+    Principal,
     ProductImageList,
     ProductList,
     ProductPublic,
     ProductSchema,
     ProductUpdate,
 )
+from fast_zero.search import SearchFields, trigram_search
 from fast_zero.security import RoleChecker, get_current_user
+from fast_zero.states import CategoryState
+from fast_zero.streaming import (
+    file_response,
+    ndjson_response,
+    wants_ndjson,
+)
 
 router = APIRouter()
 
-Session = Annotated[Session, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+Session = Annotated[AsyncSession, Depends(get_session)]
+SessionFactory = Annotated[Callable, Depends(get_session_factory)]
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 router = APIRouter(prefix='/products', tags=['products'])
 
+PRODUCT_SEARCH = SearchFields((Product.descricao,), Product.id)
+
+
+def product_version(product: Product):
+    return (product.id, product.updated_at, product.thumbnail)
+
+
+async def product_changed(session_factory, product_id: int):
+    """Invalidate a product changed outside of a request transaction."""
+    async with session_factory() as session:
+        await invalidation_bus.publish(session, 'product', product_id)
+        await session.commit()
+    await catalog_cache.invalidate_products(product_id)
+
+
+def product_list_body(products, next_cursor=None):
+    return (
+        ProductList.model_validate(
+            {'products': products, 'next_cursor': next_cursor},
+            from_attributes=True,
+        )
+        .model_dump_json()
+        .encode()
+    )
+
 
 @router.post('/', response_model=ProductPublic)
-def create_product(
+async def create_product(
     product: ProductUpdate,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
@@ -42,106 +107,430 @@ def create_product(
         data_validade=product.data_validade,
     )
     session.add(db_product)
-    session.commit()
-    session.refresh(db_product)
+    await session.flush()
+    await invalidation_bus.publish(session, 'product', db_product.id)
+    await session.commit()
+    await session.refresh(db_product)
+    await catalog_cache.invalidate_products()
+    product_index.upsert_product(db_product)
 
     return db_product
 
 
-@router.get('/', response_model=ProductList)
-def list_products(  # noqa
-    session: Session,
-    valor: str = Query(None),
-    descricao: str = Query(None),
-    categoria: str = Query(None),
-    disponivel: bool = Query(False),
-    offset: int = Query(None),
-    limit: int = Query(None),
-    current_user: CurrentUser = None,
+def filter_products(  # noqa
+    query,
+    valor: float | None = None,
+    valor_min: float | None = None,
+    valor_max: float | None = None,
+    descricao: str | None = None,
+    categoria: str | None = None,
+    disponivel: bool = False,
 ):
-    query = select(Product)
-
     if disponivel:
         query = query.filter(Product.estoque_inicial > 0)
 
     if categoria:
         query = query.filter(Product.categoria == categoria)
 
-    if valor:
-        query = query.filter(cast(Product.valor, String) == (f'{valor}'))
+    if valor is not None:
+        query = query.filter(Product.valor == valor)
+
+    if valor_min is not None:
+        query = query.filter(Product.valor >= valor_min)
+
+    if valor_max is not None:
+        query = query.filter(Product.valor <= valor_max)
 
     if descricao:
         query = query.filter(Product.descricao.contains(descricao))
 
-    products = session.scalars(query.offset(offset).limit(limit)).all()
+    return query
+
+
+def list_params(  # noqa: PLR0913
+    *,
+    valor: float | None = None,
+    valor_min: float | None = None,
+    valor_max: float | None = None,
+    descricao: str | None = None,
+    categoria: str | None = None,
+    disponivel: bool = False,
+    search: str | None = None,
+    sort: str = 'id',
+    cursor: str | None = None,
+    offset: int | None = None,
+    limit: int | None = None,
+):
+    """Normalized ``list_products`` parameters, as used in cache keys."""
+    return {
+        'valor': valor,
+        'valor_min': valor_min,
+        'valor_max': valor_max,
+        'descricao': descricao,
+        'categoria': categoria,
+        'disponivel': disponivel,
+        'search': search,
+        'sort': sort,
+        'cursor': cursor,
+        'offset': offset,
+        'limit': page_size(limit),
+    }
+
+
+def filters(params: dict):
+    return {
+        name: params[name]
+        for name in (
+            'valor',
+            'valor_min',
+            'valor_max',
+            'descricao',
+            'categoria',
+            'disponivel',
+        )
+    }
+
+
+def sort_columns(sort: str):
+    if sort.lstrip('-') == 'valor':
+        return (Product.valor, Product.id), sort.startswith('-')
+    return (Product.id,), sort.startswith('-')
+
+
+async def load_products(session, params: dict):
+    """A ``list_products`` page as ``(body, etag, last_modified)``."""
+    query = filter_products(select(Product), **filters(params))
 
-    return {'products': products}
+    if params['search']:
+        query = await trigram_search.apply(
+            session, query, fields=PRODUCT_SEARCH, term=params['search']
+        )
+        products = (
+            await session.scalars(
+                query.offset(params['offset']).limit(params['limit'])
+            )
+        ).all()
+        return (
+            product_list_body(products),
+            page_etag(products, product_version),
+            None,
+        )
+
+    columns, descending = sort_columns(params['sort'])
+    ids = product_index.page(params) if product_index.enabled else None
+    if ids is None:
+        rows = (
+            await session.scalars(
+                paginate(
+                    query,
+                    columns,
+                    cursor=params['cursor'],
+                    offset=params['offset'],
+                    limit=params['limit'],
+                    descending=descending,
+                )
+            )
+        ).all()
+    else:
+        # The index picks the page; the rows come fresh by primary key.
+        found = {
+            product.id: product
+            for product in await session.scalars(
+                select(Product).where(by_ids(ids))
+            )
+        }
+        rows = [found[id] for id in ids if id in found]
+    products, next_cursor = next_page(rows, columns, params['limit'])
+    return (
+        product_list_body(products, next_cursor),
+        page_etag(products, product_version, next_cursor),
+        None,
+    )
+
+
+async def load_product(session, id: int):
+    product = await session.scalar(select(Product).where(Product.id == id))
+    if not product:
+        return None
+
+    return (
+        ProductPublic.model_validate(product, from_attributes=True)
+        .model_dump_json()
+        .encode(),
+        make_etag(*product_version(product)),
+        product.updated_at,
+    )
+
+
+async def warm_up(session_factory):
+    """Prime the first page of the catalog and of each category."""
+    for categoria in (None, *(category.name for category in CategoryState)):
+        params = list_params(categoria=categoria)
+        await catalog_cache.prime(
+            catalog_cache.key('products:list', **params),
+            lambda session, params=params: load_products(session, params),
+            session_factory,
+            catalog_cache.stale_for(categoria),
+        )
+
+
+@router.post('/bulk', response_model=BulkResult)
+async def create_products_bulk(
+    request: Request,
+    session: Session,
+    _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
+):
+    created, errors = [], RowErrors()
+    statement = insert(Product).returning(
+        Product.id, sort_by_parameter_order=True
+    )
+
+    async for chunk in validated_chunks(request, ProductSchema, errors):
+        ids = (
+            await session.scalars(
+                statement, [product.model_dump() for _, product in chunk]
+            )
+        ).all()
+        await invalidation_bus.publish(session, 'product', *ids)
+        await session.commit()
+        created += [{'row': row, 'id': id} for (row, _), id in zip(chunk, ids)]
+        for (_row, product), id in zip(chunk, ids):
+            product_index.upsert_product(product, id=id)
+
+    if created:
+        await catalog_cache.invalidate_products()
+
+    return {
+        'created': created,
+        'errors': errors.rows,
+        'error_count': errors.count,
+    }
+
+
+@router.get('/', response_model=ProductList)
+async def list_products(  # noqa
+    request: Request,
+    session: Session,
+    open_session: SessionFactory,
+    valor: float = Query(None),
+    valor_min: float = Query(None),
+    valor_max: float = Query(None),
+    descricao: str = Query(None),
+    categoria: str = Query(None),
+    disponivel: bool = Query(False),
+    search: str = Query(None, min_length=1),
+    sort: str = Query('id', pattern=r'^-?(id|valor)$'),
+    cursor: str = Query(None),
+    offset: int = Query(None, ge=0),
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: CurrentUser = None,
+):
+    params = list_params(
+        valor=valor,
+        valor_min=valor_min,
+        valor_max=valor_max,
+        descricao=descricao,
+        categoria=categoria,
+        disponivel=disponivel,
+        search=search,
+        sort=sort,
+        cursor=cursor,
+        offset=offset,
+        limit=limit,
+    )
+    if search and cursor:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Search results are paged with offset, not cursor.',
+        )
+
+    if wants_ndjson(request) and not search:
+        columns, descending = sort_columns(sort)
+        query = keyset(
+            filter_products(select(Product), **filters(params)),
+            columns,
+            cursor,
+            descending,
+        )
+        return ndjson_response(
+            open_session, query.offset(offset).limit(limit), ProductPublic
+        )
+
+    return await catalog_cache.serve(
+        request,
+        catalog_cache.key('products:list', **params),
+        lambda session: load_products(session, params),
+        session,
+        open_session,
+        catalog_cache.stale_for(categoria),
+    )
 
 
 @router.get('/{id}', response_model=ProductPublic)
-def show_product(  # noqa
+async def show_product(  # noqa
     id: int,
+    request: Request,
     session: Session,
+    open_session: SessionFactory,
     current_user: CurrentUser = None,
 ):
-    product: Product = session.scalars(
-        select(Product).filter(Product.id == id)
-    ).first()
+    return await catalog_cache.serve(
+        request,
+        catalog_cache.key('products:show', id=id),
+        lambda session: load_product(session, id),
+        session,
+        open_session,
+    )
+
 
-    return product
+async def image_files(session, product_id: int):
+    """The product's images, and the ``(file_name, content_hash)`` of
+    each and of its variants, for ``remove_orphans``."""
+    product_images = (
+        await session.scalars(
+            select(ProductImage).where(ProductImage.product_id == product_id)
+        )
+    ).all()
+    files = [(image.file_name, image.content_hash) for image in product_images]
+    files += (
+        await session.execute(
+            select(
+                ProductImageVariant.file_name,
+                ProductImageVariant.content_hash,
+            ).where(
+                ProductImageVariant.image_id.in_(
+                    image.id for image in product_images
+                )
+            )
+        )
+    ).all()
+    return product_images, files
 
 
 @router.post('/{id}/images', response_model=ProductImageList)
 async def upload_images(  # noqa
     id: int,
     session: Session,
+    open_session: SessionFactory,
+    background_tasks: BackgroundTasks,
     files: Annotated[
         List[UploadFile],
         File(description='Multiple images'),
     ],
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    list_db_image = []
-    if files:
-        oldImages = session.scalars(
-            select(ProductImage).where(ProductImage.product_id == id)
-        ).all()
-        for oldImage in oldImages:
-            session.delete(oldImage)
-            session.commit()
-            os.remove(f'{os.getcwd()}/product_images/{oldImage.file_name}')
+    if not await session.get(Product, id):
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Product not found.'
+        )
 
+    stored, placed = [], []
+    try:
         for image in files:
-            try:
-                _, ext = image.content_type.split('/')
-                image.filename = f'{uuid.uuid4()}.{ext}'
-                file_path = f'{os.getcwd()}/product_images/{image.filename}'
-                with open(file_path, 'wb') as f:
-                    f.write(image.file.read())
-                    f.close()
-
-                db_image: ProductImage = ProductImage(
-                    product_id=id,
-                    file_name=image.filename,
-                    file_type=image.content_type,
-                )
-                session.add(db_image)
-                session.commit()
-                list_db_image.append(db_image)
-            except Exception as e:
-                print(str(e))
+            stored.append((*await store_upload(image), image.content_type))
+
+        # Held until commit, so no cleanup can unlink a blob between
+        # placing it (or finding it already there) and the new row.
+        await lock_blobs(
+            session, (content_hash for *_names, content_hash, _type in stored)
+        )
+        for partial, name, content_hash, _type in stored:
+            await run_in_threadpool(place_blob, image_path(partial), name)
+            placed.append((name, content_hash))
+
+        old_images, old_files = await image_files(session, id)
+        for old_image in old_images:
+            await session.delete(old_image)
+
+        new_images = [
+            ProductImage(
+                product_id=id,
+                file_name=name,
+                file_type=file_type,
+                content_hash=content_hash,
+            )
+            for _partial, name, content_hash, file_type in stored
+        ]
+        session.add_all(new_images)
+        await invalidation_bus.publish(session, 'product', id)
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        await remove_images(
+            partial for partial, *_rest in stored[len(placed) :]
+        )
+        await remove_orphans(open_session, placed)
+        raise
+
+    await catalog_cache.invalidate_products(id)
+
+    # Old files go only once no committed row points at them.
+    background_tasks.add_task(remove_orphans, open_session, old_files)
+    if variant_pool.enabled:
+        background_tasks.add_task(
+            variant_pool.generate,
+            open_session,
+            [
+                (image.id, image.file_name, image.content_hash)
+                for image in new_images
+            ],
+        )
+        # The thumbnail is part of the product, so drop it once more
+        # after the variants land.
+        background_tasks.add_task(product_changed, open_session, id)
+
+    return {'product_images': new_images}
+
+
+@router.get('/{id}/images/{image_id}')
+async def show_image(
+    id: int,
+    image_id: int,
+    request: Request,
+    session: Session,
+    variant: str = Query(None, pattern=r'^(thumbnail|webp)$'),
+):
+    image = await session.scalar(
+        select(ProductImage).where(
+            ProductImage.id == image_id, ProductImage.product_id == id
+        )
+    )
+    if image and variant:
+        image = await session.scalar(
+            select(ProductImageVariant).where(
+                ProductImageVariant.image_id == image_id,
+                ProductImageVariant.kind == variant,
+            )
+        )
 
-    return {'product_images': list_db_image}
+    if not image:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Image not found.'
+        )
+
+    # Stored files never change under a given name, so they can be cached
+    # for as long as clients like.
+    return file_response(
+        request,
+        image_path(image.file_name),
+        image.file_type,
+        headers={
+            'ETag': f'"{image.content_hash or image.file_name}"',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+        },
+    )
 
 
 @router.patch('/{product_id}', response_model=ProductPublic)
-def patch_product(
+async def patch_product(
     product_id: int,
     session: Session,
     product: ProductSchema,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    db_product = session.scalar(select(Product).where(Product.id == product_id))
+    db_product = await session.scalar(
+        select(Product).where(Product.id == product_id)
+    )
 
     if not db_product:
         raise HTTPException(
@@ -152,26 +541,40 @@ def patch_product(
         setattr(db_product, key, value)
 
     session.add(db_product)
-    session.commit()
-    session.refresh(db_product)
+    await invalidation_bus.publish(session, 'product', product_id)
+    await session.commit()
+    await session.refresh(db_product)
+    await catalog_cache.invalidate_products(product_id)
+    product_index.upsert_product(db_product)
 
     return db_product
 
 
 @router.delete('/{product_id}', response_model=Message)
-def delete_product(
+async def delete_product(
     product_id: int,
     session: Session,
+    open_session: SessionFactory,
+    background_tasks: BackgroundTasks,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    product = session.scalar(select(Product).where(Product.id == product_id))
+    product = await session.scalar(
+        select(Product).where(Product.id == product_id)
+    )
 
     if not product:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Product not found.'
         )
 
-    session.delete(product)
-    session.commit()
+    _images, files = await image_files(session, product_id)
+    await session.delete(product)
+    await invalidation_bus.publish(session, 'product', product_id)
+    await session.commit()
+    await catalog_cache.invalidate_products(product_id)
+    product_index.remove(product_id)
+    # The image rows went with the product; their files go once no
+    # other product shares them.
+    background_tasks.add_task(remove_orphans, open_session, files)
 
     return {'message': 'Product has been deleted successfully.'}
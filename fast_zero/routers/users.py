@@ -3,29 +3,38 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fast_zero.database import get_session
+from fast_zero.invalidation import invalidation_bus
 from fast_zero.models import User
-from fast_zero.schemas import Message, UserList, UserPublic, UserSchema
+from fast_zero.schemas import (
+    Message,
+    Principal,
+    UserList,
+    UserPublic,
+    UserSchema,
+)
 from fast_zero.security import (
     RoleChecker,
     get_current_user,
-    get_password_hash,
+    hashing_pool,
+    invalidate_principal,
+    revoke_principal,
 )
 
 router = APIRouter(prefix='/users', tags=['users'])
-Session = Annotated[Session, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+Session = Annotated[AsyncSession, Depends(get_session)]
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
-def create_user(
+async def create_user(
     user: UserSchema,
     session: Session,
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
 ):
-    db_user = session.scalar(
+    db_user = await session.scalar(
         select(User).where(
             (User.username == user.username) | (User.email == user.email)
         )
@@ -43,7 +52,7 @@ def create_user(
                 detail='Email already exists',
             )
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hashing_pool.hash(user.password)
     db_user = User(
         username=user.username,
         password=hashed_password,
@@ -51,73 +60,86 @@ def create_user(
         role=user.role,
     )
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
 
     return db_user
 
 
 @router.get('/', response_model=UserList)
-def list_users(
+async def list_users(
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
     session: Session,
     skip: int = 0,
     limit: int = 100,
 ):
-    users = session.scalars(
-        select(User).where(User.role == 'guest').offset(skip).limit(limit)
+    users = (
+        await session.scalars(
+            select(User).where(User.role == 'guest').offset(skip).limit(limit)
+        )
     ).all()
     return {'users': users}
 
 
 @router.get('/{id}', response_model=UserPublic)
-def show_user(
+async def show_user(
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
     id: int,
     session: Session,
 ):
-    user: User = session.scalars(select(User).filter(User.id == id)).first()
+    user: User = (
+        await session.scalars(select(User).filter(User.id == id))
+    ).first()
 
     return user
 
 
 @router.put('/{user_id}', response_model=UserPublic)
-def update_user(
+async def update_user(
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
     user_id: int,
     user: UserSchema,
     session: Session,
     current_user: CurrentUser,
 ):
-    db_user = session.scalar(select(User).where(User.id == user_id))
+    db_user = await session.scalar(select(User).where(User.id == user_id))
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
         )
 
+    previous_email = db_user.email
     db_user.username = user.username
-    db_user.password = get_password_hash(user.password)
+    db_user.password = await hashing_pool.hash(user.password)
     db_user.email = user.email
-    session.commit()
-    session.refresh(db_user)
+    revoke_principal(session, db_user.id)
+    await invalidation_bus.publish(
+        session, 'principal', previous_email, db_user.email
+    )
+    await session.commit()
+    await session.refresh(db_user)
+    invalidate_principal(previous_email, db_user.email)
 
     return db_user
 
 
 @router.delete('/{user_id}', response_model=Message)
-def delete_user(
+async def delete_user(
     _: Annotated[bool, Depends(RoleChecker(allowed_roles=['admin']))],
     user_id: int,
     session: Session,
     current_user: CurrentUser,
 ):
-    db_user = session.scalar(select(User).where(User.id == user_id))
+    db_user = await session.scalar(select(User).where(User.id == user_id))
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
         )
 
-    session.delete(db_user)
-    session.commit()
+    await session.delete(db_user)
+    revoke_principal(session, db_user.id)
+    await invalidation_bus.publish(session, 'principal', db_user.email)
+    await session.commit()
+    invalidate_principal(db_user.email)
 
     return {'message': 'User deleted'}
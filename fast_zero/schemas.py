@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 
 from pydantic import BaseModel, ConfigDict, EmailStr
 
@@ -37,6 +37,14 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
+class Principal(BaseModel):
+    id: int
+    username: str
+    email: str
+    role: str
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 class ClientSchema(BaseModel):
     nome_completo: str
     email: str
@@ -59,6 +67,7 @@ class ClientUpdate(BaseModel):
 
 class ClientList(BaseModel):
     clients: list[ClientPublic]
+    next_cursor: str | None = None
 
 
 class ProductSchema(BaseModel):
@@ -90,10 +99,35 @@ class ProductPublic(BaseModel):
     categoria: CategoryState
     estoque_inicial: int
     data_validade: date | None = None
+    thumbnail: str | None = None
 
 
 class ProductList(BaseModel):
     products: list[ProductPublic]
+    next_cursor: str | None = None
+
+
+class BulkRowError(BaseModel):
+    row: int
+    detail: str | list
+
+
+class BulkCreated(BaseModel):
+    row: int
+    id: int
+
+
+class BulkResult(BaseModel):
+    created: list[BulkCreated]
+    errors: list[BulkRowError]
+    error_count: int
+
+
+class ClientBulkResult(BaseModel):
+    inserted: int
+    updated: int
+    errors: list[BulkRowError]
+    error_count: int
 
 
 class OrderSchema(BaseModel):
@@ -116,6 +150,7 @@ class OrderPublic(BaseModel):
 
 class OrderList(BaseModel):
     orders: list[OrderPublic]
+    next_cursor: str | None = None
 
 
 class ProductImage(BaseModel):
@@ -126,3 +161,14 @@ class ProductImage(BaseModel):
 
 class ProductImageList(BaseModel):
     product_images: list[ProductImage]
+
+
+class ExportJobPublic(BaseModel):
+    id: str
+    state: str
+    rows_written: int
+    total_rows: int | None = None
+    error: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+
+from sqlalchemy import func, or_, text
+
+
+@dataclass(frozen=True)
+class SearchFields:
+    """Columns a search matches on, and the order among equal scores."""
+
+    columns: tuple
+    tiebreaker: object
+
+
+class TrigramSearch:
+    """Substring search ranked by ``pg_trgm`` similarity when available.
+
+    Without the extension the same filter degrades to ``ILIKE`` and
+    results keep their primary key order.
+    """
+
+    def __init__(self):
+        self.available = None
+
+    async def is_available(self, session):
+        if self.available is None:
+            self.available = bool(
+                await session.scalar(
+                    text(
+                        'SELECT EXISTS (SELECT 1 FROM pg_extension '
+                        "WHERE extname = 'pg_trgm')"
+                    )
+                )
+            )
+        return self.available
+
+    def reset(self):
+        self.available = None
+
+    async def apply(self, session, query, *, fields: SearchFields, term):
+        columns, tiebreaker = fields.columns, fields.tiebreaker
+        matches = [
+            column.icontains(term, autoescape=True) for column in columns
+        ]
+
+        if not await self.is_available(session):
+            return query.where(or_(*matches)).order_by(tiebreaker)
+
+        similar = [column.op('%')(term) for column in columns]
+        score = func.greatest(
+            *(func.similarity(column, term) for column in columns)
+        )
+        return query.where(or_(*similar, *matches)).order_by(
+            score.desc(), tiebreaker
+        )
+
+
+trigram_search = TrigramSearch()
+
+TRIGRAM_INDEXES = [
+    ('ix_clients_nome_completo_trgm', 'clients', 'nome_completo'),
+    ('ix_clients_cpf_trgm', 'clients', 'cpf'),
+    ('ix_clients_email_trgm', 'clients', 'email'),
+    ('ix_products_descricao_trgm', 'products', 'descricao'),
+]
+
+
+def ensure_trigram_indexes(engine):
+    """Create ``pg_trgm`` and the trigram indexes if they are missing.
+
+    The migration skips both when the extension can't be created; run
+    this once a role that may create it is available. Safe to re-run.
+    """
+    with engine.begin() as connection:
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for name, table, column in TRIGRAM_INDEXES:
+            connection.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+                    f'USING gin ({column} gin_trgm_ops)'
+                )
+            )
+
+
+if __name__ == '__main__':
+    from fast_zero.database import engine
+
+    ensure_trigram_indexes(engine)
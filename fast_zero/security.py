@@ -5,22 +5,37 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt import DecodeError, ExpiredSignatureError, decode, encode
-from pwdlib import PasswordHash
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from zoneinfo import ZoneInfo
 
+from fast_zero.cache import TTLCache
 from fast_zero.database import get_session
-from fast_zero.models import User
-from fast_zero.schemas import TokenData
+from fast_zero.hashing import HashingPool, check_password, hash_password
+from fast_zero.models import RevokedPrincipal, User
+from fast_zero.revocation import RevocationFilter
+from fast_zero.schemas import Principal, TokenData
 from fast_zero.settings import Settings
 
 settings = Settings()
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-pwd_context = PasswordHash.recommended()
+hashing_pool = HashingPool(
+    max_workers=settings.HASHING_WORKERS,
+    max_queue=settings.HASHING_MAX_QUEUE,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+revocation_filter = RevocationFilter(
+    size=settings.REVOCATION_FILTER_BITS,
+    hashes=settings.REVOCATION_FILTER_HASHES,
+    refresh_seconds=settings.REVOCATION_REFRESH_SECONDS,
+    retention=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+)
 
 
 def create_access_token(data: dict):
@@ -33,16 +48,25 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def principal_claims(user: User | Principal):
+    return {
+        'sub': user.email,
+        'uid': user.id,
+        'username': user.username,
+        'role': user.role,
+    }
+
+
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)
 
 
 async def get_current_user(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
@@ -62,19 +86,76 @@ async def get_current_user(
     except ExpiredSignatureError:
         raise credentials_exception
 
-    user = session.scalar(select(User).where(User.email == token_data.username))
+    if settings.STATELESS_AUTH:
+        principal = await principal_from_claims(session, payload)
+        if principal is not None:
+            return principal
+
+    principal = principal_cache.get(token_data.username)
+    if principal is not None:
+        return principal
+
+    # A change committed while the user is read invalidates the cache
+    # meanwhile; the generation check keeps the stale read out of it.
+    generation = principal_cache.generation
+    user = await session.scalar(
+        select(User).where(User.email == token_data.username)
+    )
 
     if user is None:
         raise credentials_exception
 
-    return user
+    principal = Principal.model_validate(user)
+    principal_cache.set(token_data.username, principal, generation=generation)
+
+    return principal
+
+
+async def principal_from_claims(session: AsyncSession, payload: dict):
+    """Build the principal from signed claims, or None to hit the DB."""
+    if not all(claim in payload for claim in ('uid', 'username', 'role')):
+        return None
+
+    if revocation_filter.is_stale():
+        await revocation_filter.refresh(session)
+
+    if payload['uid'] in revocation_filter:
+        return None
+
+    return Principal(
+        id=payload['uid'],
+        username=payload['username'],
+        email=payload['sub'],
+        role=payload['role'],
+    )
+
+
+def invalidate_principal(*emails: str):
+    principal_cache.invalidate(*emails)
+
+
+def evict_principals(*emails: str):
+    """Forget principals changed on another node."""
+    invalidate_principal(*emails)
+    revocation_filter.expire()
+
+
+def flush_principals():
+    principal_cache.clear()
+    revocation_filter.expire()
+
+
+def revoke_principal(session: AsyncSession, user_id: int):
+    """Record in the current transaction that a user's claims are stale."""
+    session.add(RevokedPrincipal(user_id=user_id))
+    revocation_filter.add(user_id)
 
 
 class RoleChecker:
     def __init__(self, allowed_roles):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: Annotated[User, Depends(get_current_user)]):
+    def __call__(self, user: Annotated[Principal, Depends(get_current_user)]):
         if user.role in self.allowed_roles:
             return True
         raise HTTPException(
@@ -7,7 +7,39 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str
+    DATABASE_ASYNC: bool = False
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    PRINCIPAL_CACHE_MAXSIZE: int = 1024
+    CATALOG_CACHE_TTL_SECONDS: float = 30
+    CATALOG_CACHE_MAXSIZE: int = 1024
+    CATALOG_CACHE_URL: str | None = None
+    CATALOG_STALE_SECONDS: float = 30
+    CATALOG_CATEGORY_STALE_SECONDS: dict[str, float] = {}
+    CATALOG_WARM_UP: bool = False
+    PRODUCT_INDEX: bool = False
+    PRODUCT_INDEX_RELOAD_DELAY_SECONDS: float = 1
+    CACHE_INVALIDATION_CHANNEL: str | None = None
+    DEFAULT_PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
+    BULK_CHUNK_SIZE: int = 1000
+    BULK_MAX_RECORD_BYTES: int = 1024 * 1024
+    BULK_MAX_ERRORS: int = 1000
+    STREAM_BATCH_SIZE: int = 1000
+    EXPORT_DIR: str = 'exports'
+    EXPORT_MAX_JOBS: int = 2
+    EXPORT_RETENTION_SECONDS: float = 24 * 60 * 60
+    SNAPSHOT_DIR: str = 'snapshots'
+    IMAGE_DIR: str = 'product_images'
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_THUMBNAIL_SIZE: int = 320
+    IMAGE_VARIANT_WORKERS: int = 2
+    HASHING_WORKERS: int = 2
+    HASHING_MAX_QUEUE: int = 32
+    STATELESS_AUTH: bool = False
+    REVOCATION_FILTER_BITS: int = 2**16
+    REVOCATION_FILTER_HASHES: int = 4
+    REVOCATION_REFRESH_SECONDS: float = 30
     SENTRY_DSN: str
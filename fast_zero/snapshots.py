@@ -0,0 +1,226 @@
+"""Incremental Parquet snapshot of orders and order_products.
+
+Writes Hive-style month partitions that analysts can scan instead of
+the production tables:
+
+    snapshots/orders/month=2024-05/data.parquet
+    snapshots/order_products/month=2024-05/data.parquet
+
+The watermark is the newest ``orders.updated_at`` already written (kept
+in ``_state.json``). Each run rewrites the months, by ``created_at``,
+of the orders touched since then, so new orders and state changes both
+reach the snapshot; order lines are filed under their order's month.
+
+Hard-deleted orders leave no ``updated_at`` behind: they only drop out
+when something else in their month changes, or on a ``--full`` run,
+which rewrites every month.
+
+    $ python -m fast_zero.snapshots --directory snapshots
+
+Needs ``pyarrow``, which the API itself does not depend on; install
+it with the ``snapshots`` extra (``poetry install --extras snapshots``).
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, text
+
+from fast_zero.models import Order, OrderProduct
+from fast_zero.settings import Settings
+
+settings = Settings()
+
+ORDERS = pa.schema([
+    ('id', pa.int64()),
+    ('state', pa.string()),
+    ('client_id', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+])
+ORDER_PRODUCTS = pa.schema([
+    ('order_id', pa.int64()),
+    ('product_id', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+])
+
+
+def read_state(directory: str):
+    try:
+        with open(
+            os.path.join(directory, '_state.json'), encoding='utf-8'
+        ) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(directory: str, state: dict):
+    path = os.path.join(directory, '_state.json')
+    with open(f'{path}.part', 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(f'{path}.part', path)
+
+
+def next_month(start: datetime):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+class PartitionWriter:
+    """Rewrites one Parquet file per month, swapped in on ``close``."""
+
+    name = 'data.parquet'
+
+    def __init__(self, directory: str, table: str, schema):
+        self.directory = os.path.join(directory, table)
+        self.schema = schema
+        self.writers = {}
+        self.rows = 0
+
+    def write(self, month: str, rows: list[dict]):
+        if month not in self.writers:
+            path = os.path.join(self.directory, f'month={month}')
+            os.makedirs(path, exist_ok=True)
+            self.writers[month] = pq.ParquetWriter(
+                os.path.join(path, f'{self.name}.part'), self.schema
+            )
+        self.writers[month].write_table(
+            pa.Table.from_pylist(rows, schema=self.schema)
+        )
+        self.rows += len(rows)
+
+    def close(self):
+        for month, writer in self.writers.items():
+            writer.close()
+            path = os.path.join(self.directory, f'month={month}')
+            os.replace(
+                os.path.join(path, f'{self.name}.part'),
+                os.path.join(path, self.name),
+            )
+            # Part files left by snapshots that only appended.
+            for file_name in os.listdir(path):
+                if file_name.endswith('.parquet') and file_name != self.name:
+                    os.remove(os.path.join(path, file_name))
+
+
+def write_batches(connection, query, writer, month_of, batch_size):
+    result = connection.execute(
+        query.execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for partition in result.mappings().partitions():
+        months = {}
+        for row in partition:
+            record = dict(row)
+            months.setdefault(month_of(record), []).append(record)
+        for month, rows in months.items():
+            writer.write(month, rows)
+
+
+def snapshot(
+    engine,
+    directory: str,
+    lag_seconds: float = 60,
+    batch_size=None,
+    full=False,
+):
+    """Rewrite the months holding orders updated since the watermark.
+
+    Updates younger than ``lag_seconds`` by the database clock are left
+    for the next run, so rows from transactions still in flight aren't
+    skipped over. ``full`` ignores the watermark and rewrites every
+    month.
+    """
+    batch_size = batch_size or settings.STREAM_BATCH_SIZE
+    low = None if full else read_state(directory).get('updated_at')
+
+    with engine.connect() as connection:
+        cutoff = connection.scalar(
+            text('SELECT now() - make_interval(secs => :lag)'),
+            {'lag': lag_seconds},
+        )
+        month = func.date_trunc('month', Order.created_at)
+        changed = (
+            select(month, func.max(Order.updated_at))
+            .where(Order.updated_at < cutoff)
+            .group_by(month)
+            .order_by(month)
+        )
+        if low is not None:
+            changed = changed.where(
+                Order.updated_at > datetime.fromisoformat(low)
+            )
+        changed = connection.execute(changed).all()
+        if not changed:
+            return {
+                'updated_at': low,
+                'months': [],
+                'orders': 0,
+                'order_products': 0,
+            }
+
+        orders = PartitionWriter(directory, 'orders', ORDERS)
+        order_products = PartitionWriter(
+            directory, 'order_products', ORDER_PRODUCTS
+        )
+        for start, _updated_at in changed:
+            window = (
+                Order.created_at >= start,
+                Order.created_at < next_month(start),
+                Order.created_at < cutoff,
+            )
+            write_batches(
+                connection,
+                select(Order.id, Order.state, Order.client_id, Order.created_at)
+                .where(*window)
+                .order_by(Order.id),
+                orders,
+                lambda row: f'{row["created_at"]:%Y-%m}',
+                batch_size,
+            )
+            write_batches(
+                connection,
+                select(
+                    OrderProduct.order_id,
+                    OrderProduct.product_id,
+                    OrderProduct.created_at,
+                    Order.created_at.label('order_created_at'),
+                )
+                .join(Order, Order.id == OrderProduct.order_id)
+                .where(*window)
+                .order_by(OrderProduct.order_id, OrderProduct.product_id),
+                order_products,
+                lambda row: f'{row.pop("order_created_at"):%Y-%m}',
+                batch_size,
+            )
+
+    orders.close()
+    order_products.close()
+    high = max(updated_at for _start, updated_at in changed).isoformat()
+    write_state(directory, {'updated_at': high})
+
+    return {
+        'updated_at': high,
+        'months': [f'{start:%Y-%m}' for start, _updated_at in changed],
+        'orders': orders.rows,
+        'order_products': order_products.rows,
+    }
+
+
+if __name__ == '__main__':
+    from fast_zero.database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--directory', default=settings.SNAPSHOT_DIR)
+    parser.add_argument('--lag-seconds', type=float, default=60)
+    parser.add_argument(
+        '--full', action='store_true', help='rewrite every month'
+    )
+    args = parser.parse_args()
+    print(
+        json.dumps(
+            snapshot(engine, args.directory, args.lag_seconds, full=args.full)
+        )
+    )
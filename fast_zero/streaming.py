@@ -0,0 +1,127 @@
+import os
+import re
+from http import HTTPStatus
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from fast_zero.settings import Settings
+
+settings = Settings()
+
+NDJSON = 'application/x-ndjson'
+CHUNK_SIZE = 64 * 1024
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def wants_ndjson(request: Request):
+    return NDJSON in request.headers.get('accept', '')
+
+
+def ndjson_response(session_factory, query, schema):
+    """Stream ``query`` as one ``schema`` JSON document per line.
+
+    Rows are read from a server-side cursor ``STREAM_BATCH_SIZE`` at a
+    time, so memory use doesn't grow with the result. The body outlives
+    the request's dependencies, so it opens a session of its own.
+    """
+    query = query.execution_options(yield_per=settings.STREAM_BATCH_SIZE)
+
+    async def lines():
+        async with session_factory() as session:
+            result = await session.stream_scalars(query)
+            async for partition in result.partitions():
+                yield ''.join(
+                    schema.model_validate(
+                        row, from_attributes=True
+                    ).model_dump_json()
+                    + '\n'
+                    for row in partition
+                )
+
+    return StreamingResponse(lines(), media_type=NDJSON)
+
+
+def byte_range(header: str | None, size: int):
+    """Parse a single ``bytes=`` range into inclusive ``(start, end)``.
+
+    Missing, malformed or multi-range headers give ``None`` and the whole
+    file is sent; a range that starts past the end is a 416.
+    """
+    match = BYTE_RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail='Requested range not satisfiable.',
+            headers={'Content-Range': f'bytes */{size}'},
+        )
+    return start, end
+
+
+async def read_range(path: str, start: int, end: int):
+    async with await anyio.open_file(path, 'rb') as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = await file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def etag_matches(header: str | None, etag: str):
+    tags = {tag.strip().removeprefix('W/') for tag in (header or '').split(',')}
+    return '*' in tags or etag in tags
+
+
+def file_response(
+    request: Request, path: str, media_type: str, headers: dict | None = None
+):
+    """Serve ``path``, honouring a single ``Range`` request with a 206.
+
+    When ``headers`` carry an ``ETag``, a matching ``If-None-Match`` gets
+    a 304 and a stale ``If-Range`` gets the whole file. Full responses
+    go through ``FileResponse`` so servers with ``pathsend`` can hand
+    the file to the kernel.
+    """
+    headers = {'Accept-Ranges': 'bytes', **(headers or {})}
+    etag = headers.get('ETag')
+    if etag and etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='File not found.'
+        )
+
+    requested = None
+    if request.headers.get('if-range', etag) == etag:
+        requested = byte_range(request.headers.get('range'), size)
+    if requested is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = requested
+    headers |= {
+        'Content-Range': f'bytes {start}-{end}/{size}',
+        'Content-Length': str(end - start + 1),
+    }
+    return StreamingResponse(
+        read_range(path, start, end),
+        status_code=HTTPStatus.PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
+    )
@@ -0,0 +1,58 @@
+"""add trigram indexes to clients and products
+
+Revision ID: 3e8c5a71f2d4
+Revises: b7d41c0e9a12
+Create Date: 2024-07-03 09:41:27.530816
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8c5a71f2d4'
+down_revision: Union[str, None] = 'b7d41c0e9a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+TRIGRAM_INDEXES = [
+    ('ix_clients_nome_completo_trgm', 'clients', 'nome_completo'),
+    ('ix_clients_cpf_trgm', 'clients', 'cpf'),
+    ('ix_clients_email_trgm', 'clients', 'email'),
+    ('ix_products_descricao_trgm', 'products', 'descricao'),
+]
+
+
+def upgrade() -> None:
+    # pg_trgm may be missing or need a superuser; the API falls back to
+    # plain ILIKE scans in that case, so don't fail the whole upgrade.
+    # The indexes can be created later with `python -m fast_zero.search`.
+    try:
+        with op.get_bind().begin_nested():
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except sa.exc.DBAPIError as error:
+        logger.warning(
+            'Skipping trigram indexes, pg_trgm is not available (%s). '
+            'Run `python -m fast_zero.search` once it can be created.',
+            error.orig,
+        )
+        return
+
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [column],
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    for name, _, _ in TRIGRAM_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
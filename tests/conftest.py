@@ -1,11 +1,22 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
 from testcontainers.postgres import PostgresContainer
 
 from fast_zero.app import app
-from fast_zero.database import get_session
+from fast_zero.catalog import catalog_cache
+from fast_zero.database import (
+    ThreadedSession,
+    get_session,
+    get_session_factory,
+    settings,
+)
 from fast_zero.factories import (
     ClientFactory,
     OrderFactory,
@@ -13,16 +24,43 @@ from fast_zero.factories import (
     UserFactory,
 )
 from fast_zero.models import table_registry
-from fast_zero.security import get_password_hash
+from fast_zero.search import trigram_search
+from fast_zero.security import (
+    get_password_hash,
+    principal_cache,
+    revocation_filter,
+)
 
 
 @pytest.fixture()
-def clientHttp(session):
-    def get_session_override():
-        return session
-
+def clientHttp(session, engine):
+    if settings.DATABASE_ASYNC:
+        async_engine = create_async_engine(engine.url, poolclass=NullPool)
+
+        @asynccontextmanager
+        async def session_factory():
+            async with AsyncSession(
+                async_engine, expire_on_commit=False
+            ) as async_session:
+                yield async_session
+
+    else:
+
+        @asynccontextmanager
+        async def session_factory():
+            yield ThreadedSession(session)
+
+    async def get_session_override():
+        async with session_factory() as overridden_session:
+            yield overridden_session
+
+    principal_cache.clear()
+    revocation_filter.clear()
+    trigram_search.reset()
+    asyncio.run(catalog_cache.clear())
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
         yield client
 
     app.dependency_overrides.clear()
@@ -1,8 +1,11 @@
 from http import HTTPStatus
 
+import pytest
 from fastapi.testclient import TestClient
 
+import fast_zero.app
 from fast_zero.app import app
+from fast_zero.product_index import ProductIndex
 
 
 def test_get_root_path_and_return_ok_and_hello_world_json():
@@ -10,3 +13,18 @@ def test_get_root_path_and_return_ok_and_hello_world_json():
     reponse = textClient.get('/')
     assert reponse.status_code == HTTPStatus.OK
     assert reponse.json() == {'message': 'Olá Mundo!'}
+
+
+def test_startup_warns_when_product_index_has_no_invalidation(
+    monkeypatch, caplog
+):
+    pytest.importorskip('numpy')
+    index = ProductIndex()
+    index.loaded = True
+    monkeypatch.setattr(fast_zero.app, 'product_index', index)
+    monkeypatch.setattr(fast_zero.app.invalidation_bus, 'channel', None)
+
+    with TestClient(app):
+        pass
+
+    assert 'without CACHE_INVALIDATION_CHANNEL' in caplog.text
@@ -2,6 +2,8 @@ from http import HTTPStatus
 
 from freezegun import freeze_time
 
+from fast_zero.security import hashing_pool
+
 
 def test_get_token(clientHttp, user):
     response = clientHttp.post(
@@ -91,3 +93,21 @@ def test_token_expired_dont_refresh(clientHttp, user):
         )
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_get_token_hashing_pool_saturated(monkeypatch, clientHttp, user):
+    rejected = hashing_pool.rejected
+    monkeypatch.setattr(
+        hashing_pool,
+        'pending',
+        hashing_pool.max_workers + hashing_pool.max_queue,
+    )
+
+    response = clientHttp.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.headers['Retry-After'] == '1'
+    assert hashing_pool.stats()['rejected'] == rejected + 1
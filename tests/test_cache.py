@@ -0,0 +1,194 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Request
+from freezegun import freeze_time
+
+from fast_zero.cache import TTLCache
+from fast_zero.catalog import CatalogCache, MemoryBackend
+
+REQUEST = Request({'type': 'http', 'headers': []})
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.get('a')
+    cache.set('c', 'C')
+
+    assert cache.get('a') == 'A'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'C'
+
+
+def test_cache_expires_entries_after_ttl():
+    cache = TTLCache(maxsize=2, ttl=60)
+
+    with freeze_time('2024-06-01 12:00:00'):
+        cache.set('a', 1)
+
+    with freeze_time('2024-06-01 12:00:59'):
+        assert cache.get('a') == 1
+
+    with freeze_time('2024-06-01 12:01:01'):
+        assert cache.get('a') is None
+
+
+def test_cache_counts_hits_and_misses():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+    cache.invalidate('a')
+    cache.get('a')
+
+    assert cache.stats() == {'size': 0, 'maxsize': 2, 'hits': 1, 'misses': 2}
+
+
+def test_cache_refuses_values_read_before_an_invalidation():
+    cache = TTLCache(maxsize=2, ttl=60)
+    expected_value = 2
+    generation = cache.generation
+    cache.invalidate('a')
+
+    cache.set('a', 1, generation=generation)
+    cache.set('b', expected_value, generation=cache.generation)
+
+    assert cache.get('a') is None
+    assert cache.get('b') == expected_value
+
+
+def test_cache_invalidates_by_prefix():
+    cache = TTLCache(maxsize=3, ttl=60)
+    cache.set('list:a', b'aa')
+    cache.set('list:b', b'bbb')
+    cache.set('show:1', b'c')
+
+    cache.invalidate_prefix('list:')
+
+    assert cache.get('list:a') is None
+    assert cache.get('list:b') is None
+    assert cache.get('show:1') == b'c'
+
+
+def test_cache_measures_entries():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', b'aa')
+    cache.set('b', b'bbb')
+    expected_bytes = 5
+
+    assert cache.nbytes() == expected_bytes
+
+
+def catalog(fresh_seconds=60, stale_seconds=0, **category_stale_seconds):
+    return CatalogCache(
+        MemoryBackend(maxsize=4, ttl=600),
+        fresh_seconds=fresh_seconds,
+        stale_seconds=stale_seconds,
+        category_stale_seconds=category_stale_seconds,
+    )
+
+
+@asynccontextmanager
+async def no_session():
+    yield None
+
+
+def versions():
+    """A load returning a new version of the body each time it runs."""
+    loads = []
+
+    async def load(session):
+        loads.append(session)
+        return f'{{"version": {len(loads)}}}'.encode(), f'"{len(loads)}"', None
+
+    return load, loads
+
+
+def test_catalog_cache_skips_loads_that_span_an_invalidation():
+    cache = catalog()
+
+    async def load(session):
+        await cache.invalidate_products(1)
+        return b'{}', '"etag"', None
+
+    async def scenario():
+        await cache.serve(REQUEST, 'products:show:1', load, None, no_session)
+        return await cache.backend.get('products:show:1')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_catalog_cache_serves_stale_while_refreshing():
+    cache = catalog(fresh_seconds=0, stale_seconds=60)
+    load, loads = versions()
+
+    async def scenario():
+        bodies = []
+        for _ in range(3):
+            response = await cache.serve(
+                REQUEST, 'key', load, 'request session', no_session
+            )
+            bodies.append(response.body)
+            await asyncio.sleep(0.01)
+        await cache.stop()
+        return bodies
+
+    assert asyncio.run(scenario()) == [
+        b'{"version": 1}',
+        b'{"version": 1}',
+        b'{"version": 2}',
+    ]
+    assert loads[0] == 'request session'
+    assert loads[1] is None  # refreshed on a session of its own
+    assert {
+        'stale_hits': cache.stale_hits,
+        'misses': cache.misses,
+        'refreshes': cache.refreshes,
+    } == {'stale_hits': 2, 'misses': 1, 'refreshes': 2}
+
+
+def test_catalog_cache_queues_a_key_for_refresh_once():
+    cache = catalog(fresh_seconds=0, stale_seconds=60)
+    load, loads = versions()
+
+    async def scenario():
+        await cache.serve(REQUEST, 'key', load, None, no_session)
+        await asyncio.gather(
+            *(
+                cache.serve(REQUEST, 'key', load, None, no_session)
+                for _ in range(5)
+            )
+        )
+        await asyncio.sleep(0.01)
+        await cache.stop()
+
+    asyncio.run(scenario())
+
+    expected_loads = 2
+    assert len(loads) == expected_loads
+
+
+def test_catalog_cache_loads_past_the_staleness_bound():
+    cache = catalog(fresh_seconds=0, stale_seconds=0)
+    load, _ = versions()
+
+    async def scenario():
+        for _ in range(2):
+            await cache.serve(REQUEST, 'key', load, None, no_session)
+
+    asyncio.run(scenario())
+
+    expected_misses = 2
+    assert cache.misses == expected_misses
+    assert cache.stale_hits == 0
+
+
+def test_catalog_cache_staleness_bound_per_category():
+    cache = catalog(stale_seconds=30, books=300)
+
+    expected_books, expected_default = 300, 30
+    assert cache.stale_for('books') == expected_books
+    assert cache.stale_for('games') == expected_default
+    assert cache.stale_for(None) == expected_default
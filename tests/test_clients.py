@@ -1,6 +1,13 @@
+import json
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import select
+
+from fast_zero import bulk
 from fast_zero.factories import ClientFactory
+from fast_zero.models import Client
+from fast_zero.pagination import MAX_PAGE_SIZE
 
 
 def test_create_client(clientHttp, token_admin):
@@ -193,3 +200,315 @@ def test_delete_client_error(clientHttp, token_admin):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Client not found.'}
+
+
+def test_list_clients_cursor_pagination_should_walk_all_clients(
+    session, clientHttp, token
+):
+    expected_clients = 5
+    session.bulk_save_objects(ClientFactory.create_batch(5))
+    session.commit()
+
+    seen, cursor = [], None
+    while True:
+        response = clientHttp.get(
+            '/clients/',
+            params={'limit': 2, **({'cursor': cursor} if cursor else {})},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        data = response.json()
+        seen += [client['id'] for client in data['clients']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == expected_clients
+    assert len(set(seen)) == expected_clients
+
+
+def test_list_clients_invalid_cursor(clientHttp, token):
+    response = clientHttp.get(
+        '/clients/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+
+def test_list_clients_limit_above_max_page_size(clientHttp, token):
+    response = clientHttp.get(
+        f'/clients/?limit={MAX_PAGE_SIZE + 1}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_clients_search_should_return_matching_clients(
+    session, clientHttp, token
+):
+    expected_clients = 2
+    session.bulk_save_objects([
+        ClientFactory(nome_completo='Maria Jose'),
+        ClientFactory(nome_completo='Jose Maria'),
+        ClientFactory(nome_completo='Pedro Alvares'),
+    ])
+    session.commit()
+
+    response = clientHttp.get(
+        '/clients/?search=maria',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert len(response.json()['clients']) == expected_clients
+
+
+def test_list_clients_search_rejects_cursor(clientHttp, token):
+    response = clientHttp.get(
+        '/clients/?search=maria&cursor=abc',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_upsert_clients_bulk_inserts_and_updates(
+    session, clientHttp, token_admin
+):
+    expected_updates = 2
+    existing = ClientFactory(email='maria@example.com', nome_completo='Maria')
+    session.add(existing)
+    session.commit()
+
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        json=[
+            {
+                'nome_completo': 'Maria Jose',
+                'cpf': '00011122233',
+                'email': 'maria@example.com',
+            },
+            {
+                'nome_completo': 'Joao',
+                'cpf': '00011122244',
+                'email': 'joao@example.com',
+            },
+            {
+                'nome_completo': 'Joao Pedro',
+                'cpf': '00011122244',
+                'email': 'joao@example.com',
+            },
+            {'nome_completo': 'Sem email'},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    data = response.json()
+    assert data['inserted'] == 1
+    assert data['updated'] == expected_updates
+    assert [error['row'] for error in data['errors']] == [4]
+
+    session.refresh(existing)
+    assert existing.nome_completo == 'Maria Jose'
+    joao = session.scalar(
+        select(Client).where(Client.email == 'joao@example.com')
+    )
+    assert joao.nome_completo == 'Joao Pedro'
+
+
+def test_upsert_clients_bulk_ndjson_across_chunks(
+    monkeypatch, clientHttp, token_admin
+):
+    monkeypatch.setattr(bulk.settings, 'BULK_CHUNK_SIZE', 2)
+    expected_clients = 3
+    lines = [
+        json.dumps({
+            'nome_completo': f'Cliente {n}',
+            'cpf': f'{n:011}',
+            'email': f'cliente{n % expected_clients}@example.com',
+        })
+        for n in range(5)
+    ]
+
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content='\n'.join(lines),
+    )
+
+    data = response.json()
+    assert data['inserted'] == expected_clients
+    assert data['updated'] == len(lines) - expected_clients
+
+
+def test_upsert_clients_bulk_streams_json_array(clientHttp, token_admin):
+    clients = [
+        {
+            'nome_completo': f'Cliente {n}',
+            'cpf': f'{n:011}',
+            'email': f'cliente{n}@example.com',
+        }
+        for n in range(3)
+    ]
+    body = '[{}, {{"nome_completo": "x",]}}, {}, null, {}]'.format(
+        *(json.dumps(client) for client in clients)
+    ).encode()
+
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/json',
+        },
+        content=(body[start : start + 7] for start in range(0, len(body), 7)),
+    )
+
+    data = response.json()
+    assert data['inserted'] == len(clients)
+    assert [error['row'] for error in data['errors']] == [2, 4]
+    assert data['errors'][0]['detail'] == 'Invalid JSON.'
+
+
+def test_json_array_parser_waits_for_values_split_across_chunks():
+    body = '[1000.0, -2e10, "caneta", true, {"a": [1, 2]}, null]'
+
+    for split in range(1, len(body)):
+        parser = bulk.JSONArrayParser()
+        elements = parser.feed(body[:split]) + parser.feed(body[split:])
+
+        assert elements == json.loads(body), split
+
+
+@pytest.mark.parametrize(
+    'content_type', ['application/json', 'application/x-ndjson']
+)
+def test_upsert_clients_bulk_rejects_invalid_utf8(
+    clientHttp, token_admin, content_type
+):
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': content_type,
+        },
+        content=b'[{"nome_completo": "Jo\xe3o"}]\n',
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Body is not valid UTF-8.'}
+
+
+def test_upsert_clients_bulk_caps_error_details(
+    monkeypatch, clientHttp, token_admin
+):
+    monkeypatch.setattr(bulk.settings, 'BULK_MAX_ERRORS', 2)
+    expected_errors = 5
+
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content=b'{\n' * expected_errors,
+    )
+
+    data = response.json()
+    assert [error['row'] for error in data['errors']] == [1, 2]
+    assert data['error_count'] == expected_errors
+
+
+def test_upsert_clients_bulk_rejects_oversized_record(
+    monkeypatch, clientHttp, token_admin
+):
+    monkeypatch.setattr(bulk.settings, 'BULK_MAX_RECORD_BYTES', 64)
+
+    response = clientHttp.post(
+        '/clients/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content=b'{"nome_completo": "' + b'x' * 100,
+    )
+
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_list_clients_streams_ndjson(session, clientHttp, token):
+    expected_clients = 5
+    session.bulk_save_objects(ClientFactory.create_batch(5))
+    session.commit()
+
+    response = clientHttp.get(
+        '/clients/',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/x-ndjson',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    clients = [json.loads(line) for line in response.text.splitlines()]
+    assert len(clients) == expected_clients
+    assert [client['id'] for client in clients] == sorted(
+        client['id'] for client in clients
+    )
+
+
+def test_show_client_if_modified_since(clientHttp, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first = clientHttp.get(f'/clients/{client.id}', headers=headers)
+
+    response = clientHttp.get(
+        f'/clients/{client.id}',
+        headers={
+            **headers,
+            'If-Modified-Since': first.headers['last-modified'],
+        },
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.parametrize(
+    ('since', 'expected_status'),
+    [
+        ('Sat, 01 Jan 2000 00:00:00 -0000', HTTPStatus.OK),
+        ('Fri Jan  1 00:00:00 2100', HTTPStatus.NOT_MODIFIED),
+    ],
+)
+def test_show_client_if_modified_since_without_zone(
+    clientHttp, client, token, since, expected_status
+):
+    response = clientHttp.get(
+        f'/clients/{client.id}',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'If-Modified-Since': since,
+        },
+    )
+
+    assert response.status_code == expected_status
+
+
+def test_list_clients_etag_changes_with_new_client(session, clientHttp, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(ClientFactory.create_batch(2))
+    session.commit()
+    etag = clientHttp.get('/clients/', headers=headers).headers['etag']
+    session.add(ClientFactory())
+    session.commit()
+
+    response = clientHttp.get(
+        '/clients/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
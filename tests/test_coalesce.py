@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from fast_zero.coalesce import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.run('key', work) for _ in range(5))
+        )
+
+    results = asyncio.run(scenario())
+
+    assert results == ['result'] * 5
+    assert runs == [1]
+    assert flights.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 4}
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    async def scenario():
+        await asyncio.gather(flights.run('a', work), flights.run('b', work))
+
+    asyncio.run(scenario())
+
+    expected_leaders = 2
+    assert flights.stats()['leaders'] == expected_leaders
+    assert flights.stats()['coalesced'] == 0
+
+
+def test_waiters_share_the_error():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.run('key', work),
+            flights.run('key', work),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.stats()['leaders'] == 1
+
+
+def test_waiter_takes_over_when_leader_is_cancelled():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return len(runs)
+
+    async def scenario():
+        leader = asyncio.create_task(flights.run('key', work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.run('key', work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    expected_runs = 2
+    assert asyncio.run(scenario()) == expected_runs
+    assert flights.stats()['in_flight'] == 0
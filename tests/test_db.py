@@ -1,5 +1,9 @@
+import asyncio
+
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from fast_zero import database
 from fast_zero.models import Client, Order, Product, User
 
 
@@ -66,3 +70,22 @@ def test_create_order(session, client: Client, product: Product):
 
     assert order in client.orders
     assert product in order.products
+
+
+async def _first_session():
+    sessions = database.get_session()
+    session = await anext(sessions)
+    await sessions.aclose()
+    return session
+
+
+def test_get_session_async_mode(monkeypatch):
+    monkeypatch.setattr(database.settings, 'DATABASE_ASYNC', True)
+
+    assert isinstance(asyncio.run(_first_session()), AsyncSession)
+
+
+def test_get_session_sync_mode(monkeypatch):
+    monkeypatch.setattr(database.settings, 'DATABASE_ASYNC', False)
+
+    assert isinstance(asyncio.run(_first_session()), database.ThreadedSession)
@@ -0,0 +1,224 @@
+import asyncio
+import csv
+import gzip
+import io
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+
+import pytest
+
+from fast_zero.exports import ExportRunner, export_runner, settings
+from fast_zero.factories import (
+    OrderFactory,
+    OrderProductFactory,
+    ProductFactory,
+)
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'EXPORT_DIR', str(tmp_path))
+    monkeypatch.setattr(export_runner, 'jobs', {})
+    return tmp_path
+
+
+@pytest.fixture()
+def order_lines(session, client):
+    orders = OrderFactory.create_batch(2, client_id=client.id, state='pago')
+    products = [
+        ProductFactory(secao='alimentacao'),
+        ProductFactory(secao='limpeza'),
+    ]
+    session.add_all([*orders, *products])
+    session.commit()
+    session.bulk_save_objects([
+        OrderProductFactory(order_id=orders[0].id, product_id=products[0].id),
+        OrderProductFactory(order_id=orders[0].id, product_id=products[1].id),
+        OrderProductFactory(order_id=orders[1].id, product_id=products[1].id),
+    ])
+    session.commit()
+    return orders
+
+
+def read_export(clientHttp, token_admin, job_id):
+    response = clientHttp.get(
+        f'/exports/{job_id}/download',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+    assert response.status_code == HTTPStatus.OK
+    text = gzip.decompress(response.content).decode()
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def test_export_orders_writes_one_row_per_order_line(
+    clientHttp, token_admin, client, order_lines
+):
+    expected_rows = 3
+    response = clientHttp.post(
+        '/exports/orders', headers={'Authorization': f'Bearer {token_admin}'}
+    )
+
+    assert response.status_code == HTTPStatus.ACCEPTED
+    job_id = response.json()['id']
+
+    job = clientHttp.get(
+        f'/exports/{job_id}',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    ).json()
+    assert job['state'] == 'done'
+    assert job['rows_written'] == job['total_rows'] == expected_rows
+
+    rows = read_export(clientHttp, token_admin, job_id)
+    assert len(rows) == expected_rows
+    assert rows[0]['client_email'] == client.email
+    assert rows[0]['state'] == 'pago'
+    assert {row['product_secao'] for row in rows} == {'alimentacao', 'limpeza'}
+
+
+def test_export_orders_uses_list_orders_filters(
+    clientHttp, token_admin, order_lines
+):
+    expected_rows = 2
+    response = clientHttp.post(
+        '/exports/orders?product_secao=alimentacao',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+
+    rows = read_export(clientHttp, token_admin, response.json()['id'])
+
+    assert len(rows) == expected_rows
+    assert {row['order_id'] for row in rows} == {str(order_lines[0].id)}
+
+
+def test_download_export_supports_range(clientHttp, token_admin, order_lines):
+    expected_length = 10
+    job_id = clientHttp.post(
+        '/exports/orders', headers={'Authorization': f'Bearer {token_admin}'}
+    ).json()['id']
+    full = clientHttp.get(
+        f'/exports/{job_id}/download',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+
+    response = clientHttp.get(
+        f'/exports/{job_id}/download',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Range': 'bytes=0-9',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert len(response.content) == expected_length
+    assert response.content == full.content[:expected_length]
+    assert response.headers['content-range'] == (
+        f'bytes 0-9/{len(full.content)}'
+    )
+
+
+def test_download_export_unsatisfiable_range(
+    clientHttp, token_admin, order_lines
+):
+    job_id = clientHttp.post(
+        '/exports/orders', headers={'Authorization': f'Bearer {token_admin}'}
+    ).json()['id']
+
+    response = clientHttp.get(
+        f'/exports/{job_id}/download',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Range': 'bytes=99999999-',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+def test_download_export_not_ready(clientHttp, token_admin):
+    job = export_runner.submit(settings.EXPORT_DIR)
+
+    response = clientHttp.get(
+        f'/exports/{job.id}/download',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Export is not ready.'}
+
+
+def test_export_orders_limits_concurrent_jobs(
+    clientHttp, token_admin, monkeypatch
+):
+    monkeypatch.setattr(export_runner, 'max_jobs', 1)
+    export_runner.submit(settings.EXPORT_DIR)
+
+    response = clientHttp.post(
+        '/exports/orders', headers={'Authorization': f'Bearer {token_admin}'}
+    )
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.headers['retry-after'] == '30'
+
+
+def test_show_export_not_found(clientHttp, token_admin):
+    response = clientHttp.get(
+        '/exports/missing', headers={'Authorization': f'Bearer {token_admin}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Export not found.'}
+
+
+def test_export_orders_requires_admin(clientHttp, token):
+    response = clientHttp.post(
+        '/exports/orders', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_cancelled_export_stops_counting_as_active(export_dir):
+    runner = ExportRunner(max_jobs=1, retention_seconds=60)
+    job = runner.submit(str(export_dir))
+
+    @asynccontextmanager
+    async def session_factory():
+        await asyncio.Event().wait()
+        yield
+
+    async def scenario():
+        task = asyncio.create_task(runner.run(job, session_factory, None))
+        while job.state != 'running':
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.wait({task})
+
+    asyncio.run(scenario())
+
+    assert job.state == 'failed'
+    assert job.error == 'Export was cancelled.'
+    assert job.finished_at
+    assert runner.active == 0
+
+
+def test_prune_forgets_expired_jobs_and_their_files(export_dir):
+    runner = ExportRunner(max_jobs=2, retention_seconds=60)
+    expired, recent = (
+        runner.submit(str(export_dir)),
+        runner.submit(str(export_dir)),
+    )
+    now = datetime.now(timezone.utc)
+    for job, finished_at in [
+        (expired, now - timedelta(hours=1)),
+        (recent, now),
+    ]:
+        job.state, job.finished_at = 'done', finished_at
+        with open(job.path, 'wb') as file:
+            file.write(b'x')
+
+    asyncio.run(runner.prune())
+
+    assert list(runner.jobs) == [recent.id]
+    assert list(export_dir.iterdir()) == [export_dir / f'{recent.id}.csv.gz']
+    assert runner.stats()['expired'] == 1
@@ -0,0 +1,188 @@
+import asyncio
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+from sqlalchemy import text
+
+from fast_zero.database import ThreadedSession
+from fast_zero.invalidation import MAX_PAYLOAD, InvalidationBus
+
+
+def recording_bus(channel='cache_invalidation'):
+    bus = InvalidationBus(channel, reconnect_seconds=0.01)
+    calls = []
+    bus.register(
+        'product',
+        lambda *keys: calls.append(('evict', keys)),
+        lambda: calls.append(('flush',)),
+    )
+    return bus, calls
+
+
+def test_dispatch_evicts_keys_from_other_nodes():
+    bus, calls = recording_bus()
+
+    asyncio.run(
+        bus.dispatch('{"node": "other", "entity": "product", "keys": [1, 2]}')
+    )
+
+    assert calls == [('evict', (1, 2))]
+
+
+def test_dispatch_skips_own_notices():
+    bus, calls = recording_bus()
+
+    asyncio.run(
+        bus.dispatch(
+            f'{{"node": "{bus.node}", "entity": "product", "keys": [1]}}'
+        )
+    )
+
+    assert calls == []
+
+
+def test_dispatch_flushes_entity_without_keys():
+    bus, calls = recording_bus()
+
+    asyncio.run(bus.dispatch('{"node": "other", "entity": "product"}'))
+
+    assert calls == [('flush',)]
+
+
+def test_dispatch_flushes_everything_on_unreadable_notice():
+    bus, calls = recording_bus()
+
+    asyncio.run(bus.dispatch('not json'))
+
+    assert calls == [('flush',)]
+    assert bus.stats()['flushes'] == 1
+
+
+def test_payloads_spread_many_keys_over_several_notices():
+    bus, calls = recording_bus()
+    keys = list(range(100_000, 102_000))
+
+    payloads = bus.payloads('product', keys)
+    other, _ = recording_bus()
+    other.handlers = bus.handlers
+    for payload in payloads:
+        asyncio.run(other.dispatch(payload))
+
+    assert len(payloads) > 1
+    assert all(len(payload) <= MAX_PAYLOAD for payload in payloads)
+    assert [key for _, chunk in calls for key in chunk] == keys
+
+
+def test_payloads_flush_entity_for_an_oversized_key():
+    bus, _ = recording_bus()
+
+    assert bus.payloads('product', ['x' * MAX_PAYLOAD]) == [
+        f'{{"node": "{bus.node}", "entity": "product"}}'
+    ]
+
+
+def test_publish_is_a_noop_when_disabled(session):
+    bus, _ = recording_bus(channel=None)
+    statements = []
+    session.execute = statements.append
+
+    asyncio.run(bus.publish(session, 'product', 1))
+
+    assert statements == []
+
+
+def test_listener_evicts_committed_notices(session, engine):
+    bus, calls = recording_bus()
+    other, _ = recording_bus()
+    url = engine.url.render_as_string(hide_password=False)
+
+    async def scenario():
+        listener = asyncio.create_task(bus.listen(url))
+        while not bus.connected:
+            await asyncio.sleep(0.01)
+
+        await other.publish(ThreadedSession(session), 'product', 7)
+        session.rollback()
+        await other.publish(ThreadedSession(session), 'product', 8)
+        session.commit()
+        while len(calls) < 2:  # noqa: PLR2004
+            await asyncio.sleep(0.01)
+
+        listener.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+
+    assert calls == [('flush',), ('evict', (8,))]
+
+
+def test_listener_flushes_after_reconnecting(session, engine):
+    bus, calls = recording_bus()
+    url = engine.url.render_as_string(hide_password=False)
+
+    async def scenario():
+        listener = asyncio.create_task(bus.listen(url))
+        while not bus.connected:
+            await asyncio.sleep(0.01)
+
+        session.execute(
+            text(
+                'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                "WHERE query LIKE 'LISTEN%' AND datname = current_database()"
+            )
+        )
+        session.commit()
+        while not bus.reconnects or not bus.connected:
+            await asyncio.sleep(0.01)
+
+        listener.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+
+    expected_flushes = 2
+    assert calls == [('flush',)] * expected_flushes
+
+
+def test_listener_retries_after_unexpected_errors(engine, monkeypatch):
+    bus, calls = recording_bus()
+    url = engine.url.render_as_string(hide_password=False)
+    connect = psycopg.AsyncConnection.connect
+    failures = [RuntimeError('boom')]
+
+    async def flaky_connect(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await connect(*args, **kwargs)
+
+    monkeypatch.setattr(psycopg.AsyncConnection, 'connect', flaky_connect)
+
+    async def scenario():
+        listener = asyncio.create_task(bus.listen(url))
+        while not bus.connected:
+            await asyncio.sleep(0.01)
+
+        listener.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+
+    assert bus.reconnects == 1
+    assert calls == [('flush',)]
+
+
+def test_listener_connection_uses_tcp_keepalives():
+    bus = InvalidationBus('cache_invalidation', keepalive_seconds=30)
+
+    conninfo = conninfo_to_dict(
+        bus.conninfo('postgresql+psycopg://app:secret@db:5432/app')
+    )
+
+    assert conninfo == {
+        'user': 'app',
+        'password': 'secret',
+        'host': 'db',
+        'port': '5432',
+        'dbname': 'app',
+        'keepalives': '1',
+        'keepalives_idle': '30',
+        'keepalives_interval': '10',
+        'keepalives_count': '3',
+    }
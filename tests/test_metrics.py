@@ -0,0 +1,23 @@
+from http import HTTPStatus
+
+
+def test_show_metrics(clientHttp, token_admin):
+    response = clientHttp.get(
+        '/metrics/', headers={'Authorization': f'Bearer {token_admin}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert {
+        'principal_cache',
+        'password_hashing',
+        'catalog_cache',
+        'request_coalescing',
+    } <= set(response.json())
+
+
+def test_show_metrics_requires_admin(clientHttp, token):
+    response = clientHttp.get(
+        '/metrics/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -1,7 +1,17 @@
-from datetime import date
+import json
+from datetime import date, timedelta
 from http import HTTPStatus
 
-from fast_zero.factories import OrderFactory, OrderProductFactory
+from sqlalchemy import select, text
+
+from fast_zero.factories import (
+    OrderFactory,
+    OrderProductFactory,
+    ProductFactory,
+)
+from fast_zero.models import Order
+from fast_zero.pagination import MAX_PAGE_SIZE, encode_cursor, paginate
+from fast_zero.routers.orders import filter_orders
 
 
 def test_create_order(clientHttp, token_admin, client, products):
@@ -92,6 +102,27 @@ def test_list_orders_filter_product_secao_should_return_1_orders(
     assert len(response.json()['orders']) == expected_orders
 
 
+def test_list_orders_filter_product_secao_should_not_repeat_orders(
+    session, clientHttp, token, order
+):
+    expected_orders = 1
+    products = ProductFactory.create_batch(3, secao='alimentacao')
+    session.add_all(products)
+    session.commit()
+    session.bulk_save_objects([
+        OrderProductFactory(order_id=order.id, product_id=product.id)
+        for product in products
+    ])
+    session.commit()
+
+    response = clientHttp.get(
+        '/orders/?product_secao=alimentacao',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert len(response.json()['orders']) == expected_orders
+
+
 def test_list_orders_filter_order_id_should_return_1_orders(
     clientHttp, token, order
 ):
@@ -211,3 +242,219 @@ def test_delete_order_error(clientHttp, token_admin):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Order not found.'}
+
+
+def test_list_orders_cursor_pagination_should_walk_all_orders(
+    session, client, clientHttp, token
+):
+    expected_orders = 5
+    session.bulk_save_objects(OrderFactory.create_batch(5, client_id=client.id))
+    session.commit()
+
+    seen, cursor = [], None
+    while True:
+        response = clientHttp.get(
+            '/orders/',
+            params={'limit': 2, **({'cursor': cursor} if cursor else {})},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        data = response.json()
+        seen += [order['id'] for order in data['orders']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == expected_orders
+    assert len(set(seen)) == expected_orders
+
+
+def test_list_orders_invalid_cursor(clientHttp, token):
+    response = clientHttp.get(
+        '/orders/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+
+def test_list_orders_limit_above_max_page_size(clientHttp, token):
+    response = clientHttp.get(
+        f'/orders/?limit={MAX_PAGE_SIZE + 1}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_orders_filter_created_start_only_should_return_5_orders(
+    session, client, clientHttp, token
+):
+    expected_orders = 5
+    session.bulk_save_objects(
+        OrderFactory.create_batch(expected_orders, client_id=client.id)
+    )
+    session.commit()
+
+    response = clientHttp.get(
+        f'/orders/?created_start={date.today()}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert len(response.json()['orders']) == expected_orders
+
+
+def test_list_orders_filter_created_end_is_inclusive_of_the_day(
+    session, client, clientHttp, token
+):
+    expected_orders = 5
+    session.bulk_save_objects(
+        OrderFactory.create_batch(expected_orders, client_id=client.id)
+    )
+    session.commit()
+
+    yesterday = date.today() - timedelta(days=1)
+    response = clientHttp.get(
+        f'/orders/?created_end={yesterday}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert response.json()['orders'] == []
+
+    response = clientHttp.get(
+        f'/orders/?created_end={date.today()}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert len(response.json()['orders']) == expected_orders
+
+
+def test_list_orders_filter_invalid_date(clientHttp, token):
+    response = clientHttp.get(
+        '/orders/?created_start=01/06/2024',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def _explain(session, query):
+    compiled = query.compile(dialect=session.bind.dialect)
+    plan = session.connection().exec_driver_sql(
+        f'EXPLAIN {compiled}', compiled.params
+    )
+    return '\n'.join(plan.scalars())
+
+
+def test_filter_orders_date_range_is_index_backed(session):
+    session.execute(text('SET LOCAL enable_seqscan = off'))
+
+    plan = _explain(
+        session,
+        filter_orders(
+            select(Order),
+            created_start=date(2024, 6, 1),
+            created_end=date(2024, 6, 30),
+            client_id=1,
+        ),
+    )
+
+    assert 'ix_orders_client_id_created_at' in plan
+    assert 'Seq Scan' not in plan
+
+
+def test_filter_orders_one_sided_range_is_index_backed(session):
+    session.execute(text('SET LOCAL enable_seqscan = off'))
+
+    plan = _explain(
+        session, filter_orders(select(Order), created_start=date(2024, 6, 1))
+    )
+
+    assert 'ix_orders_' in plan
+    assert 'Seq Scan' not in plan
+
+
+def test_list_orders_cursor_page_is_index_backed(session):
+    session.execute(text('SET LOCAL enable_seqscan = off'))
+    columns = (Order.created_at, Order.id)
+
+    plan = _explain(
+        session,
+        paginate(
+            filter_orders(select(Order)),
+            columns,
+            cursor=encode_cursor(['2024-06-01T00:00:00', 1]),
+        ),
+    )
+
+    assert 'Index Scan using ix_orders_created_at_id' in plan
+    assert 'Sort' not in plan
+
+
+def test_filter_orders_product_secao_is_index_backed(session):
+    session.execute(text('SET LOCAL enable_seqscan = off'))
+
+    plan = _explain(
+        session, filter_orders(select(Order), product_secao='alimentacao')
+    )
+
+    assert 'ix_products_secao' in plan
+    assert 'ix_order_products_product_id' in plan
+
+
+def test_list_orders_streams_ndjson_after_cursor(
+    session, client, clientHttp, token
+):
+    expected_orders = 3
+    session.bulk_save_objects(OrderFactory.create_batch(5, client_id=client.id))
+    session.commit()
+
+    first_page = clientHttp.get(
+        '/orders/',
+        params={'limit': 2},
+        headers={'Authorization': f'Bearer {token}'},
+    ).json()
+    response = clientHttp.get(
+        '/orders/',
+        params={'cursor': first_page['next_cursor']},
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/x-ndjson',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert len(orders) == expected_orders
+    assert not {order['id'] for order in orders} & {
+        order['id'] for order in first_page['orders']
+    }
+
+
+def test_show_order_not_modified(clientHttp, order, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = clientHttp.get(f'/orders/{order.id}', headers=headers).headers[
+        'etag'
+    ]
+
+    response = clientHttp.get(
+        f'/orders/{order.id}', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_show_order_etag_changes_after_patch(clientHttp, order, token_admin):
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    etag = clientHttp.get(f'/orders/{order.id}', headers=headers).headers[
+        'etag'
+    ]
+    new_state = 'pago' if order.state == 'cancelado' else 'cancelado'
+    clientHttp.patch(
+        f'/orders/{order.id}', json={'state': new_state}, headers=headers
+    )
+
+    response = clientHttp.get(
+        f'/orders/{order.id}', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['state'] == new_state
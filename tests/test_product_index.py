@@ -0,0 +1,246 @@
+import asyncio
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import select
+
+from fast_zero.database import ThreadedSession
+from fast_zero.factories import ProductFactory
+from fast_zero.models import Product
+from fast_zero.pagination import encode_cursor
+from fast_zero.product_index import ProductIndex
+from fast_zero.routers import products
+from fast_zero.routers.products import filter_products, list_params
+from fast_zero.states import CategoryState
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture()
+def session_factory(session):
+    @asynccontextmanager
+    async def factory():
+        yield ThreadedSession(session)
+
+    return factory
+
+
+@pytest.fixture()
+def index(session, session_factory, monkeypatch):
+    session.add_all([
+        ProductFactory(valor=valor, categoria=categoria, estoque_inicial=stock)
+        for valor, categoria, stock in [
+            (10.0, CategoryState.books, 0),
+            (5.0, CategoryState.games, 3),
+            (5.0, CategoryState.books, 1),
+            (20.0, CategoryState.shoes, 7),
+            (1.0, CategoryState.books, 2),
+        ]
+    ])
+    session.commit()
+
+    index = ProductIndex()
+    asyncio.run(index.load(session_factory))
+    monkeypatch.setattr(products, 'product_index', index)
+    return index
+
+
+def sql_page(session, params):
+    columns, descending = products.sort_columns(params['sort'])
+    query = products.paginate(
+        filter_products(select(Product), **products.filters(params)),
+        columns,
+        cursor=params['cursor'],
+        offset=params['offset'],
+        limit=params['limit'],
+        descending=descending,
+    )
+    return list(session.scalars(query.with_only_columns(Product.id)))
+
+
+@pytest.mark.parametrize(
+    'params',
+    [
+        {},
+        {'sort': 'valor'},
+        {'sort': '-valor'},
+        {'sort': '-id', 'limit': 2},
+        {'categoria': 'books', 'sort': 'valor'},
+        {'disponivel': True, 'sort': '-valor', 'offset': 1},
+        {'valor_min': 5, 'valor_max': 10, 'limit': 1},
+        {'valor': 5},
+        {'valor': 5, 'sort': '-valor'},
+        {'valor_min': 2, 'sort': 'valor', 'limit': 1},
+        {'valor_max': 10, 'sort': '-valor', 'offset': 1},
+    ],
+)
+def test_index_pages_match_sql(session, index, params):
+    params = list_params(**params)
+
+    assert index.page(params) == sql_page(session, params)
+
+
+def test_index_resumes_after_cursor(session, index):
+    first = list_params(sort='valor', limit=2)
+    ids = index.page(first)
+    last = session.get(Product, ids[1])
+    params = {**first, 'cursor': encode_cursor([last.valor, last.id])}
+
+    assert index.page(params) == sql_page(session, params)
+
+
+@pytest.mark.parametrize('sort', ['id', '-id', 'valor', '-valor'])
+def test_index_pages_without_orders(session, index, sort):
+    params = list_params(sort=sort, limit=2)
+    ids = index.page(params)
+    last = session.get(Product, ids[1])
+    cursor = [last.valor, last.id] if 'valor' in sort else [last.id]
+    params = {**params, 'cursor': encode_cursor(cursor)}
+    expected_ids = index.page(params)
+    index.orders.clear()
+
+    async def page():
+        return index.page(params)
+
+    assert asyncio.run(page()) == expected_ids == sql_page(session, params)
+
+
+def test_index_falls_back_on_text_filters(index):
+    assert index.page(list_params(descricao='x')) is None
+    assert index.page(list_params(search='x')) is None
+    assert index.page(list_params(categoria='unknown')) is None
+    expected_fallbacks = 3
+    assert index.stats()['fallbacks'] == expected_fallbacks
+
+
+def test_index_updates_and_compacts():
+    index = ProductIndex()
+    index.load_rows([(1, 1.0, 'books', 1)])
+    index.upsert((2, 3.0, 'games', 1))
+    index.upsert((1, 5.0, 'books', 1))
+    params = list_params(sort='valor')
+
+    assert index.page(params) == [2, 1]
+
+    index.remove(1, 2)
+    index.upsert((3, 2.0, 'books', 1))
+
+    assert index.page(params) == [3]
+    assert index.size == 1
+
+
+def test_index_replays_writes_made_while_loading(session, session_factory):
+    index = ProductIndex()
+    session.add(ProductFactory(valor=1.0))
+    session.commit()
+
+    @asynccontextmanager
+    async def racing_factory():
+        async with session_factory() as threaded:
+            yield threaded
+            index.upsert((999, 2.0, 'books', 1))
+
+    asyncio.run(index.load(racing_factory))
+
+    assert 999 in index.page(list_params())  # noqa: PLR2004
+
+
+def test_index_serializes_concurrent_loads(session, session_factory):
+    index = ProductIndex()
+    session.add(ProductFactory(valor=1.0))
+    session.commit()
+
+    async def scenario():
+        read, release = asyncio.Event(), asyncio.Event()
+
+        @asynccontextmanager
+        async def slow_factory():
+            async with session_factory() as threaded:
+                yield threaded
+            read.set()
+            await release.wait()
+
+        first = asyncio.create_task(index.load(slow_factory))
+        await read.wait()
+        second = asyncio.create_task(index.load(session_factory))
+        await asyncio.sleep(0.01)
+
+        product = ProductFactory(valor=2.0)
+        session.add(product)
+        session.commit()
+        index.upsert_product(product)
+        release.set()
+        await asyncio.gather(first, second)
+        return product.id
+
+    expected_loads = 2
+    product_id = asyncio.run(scenario())
+
+    assert index.loads == expected_loads
+    assert product_id in index.page(list_params())
+
+
+def test_index_invalidations_share_one_debounced_reload(
+    session, session_factory
+):
+    index = ProductIndex(reload_delay=0.01)
+    session.add(ProductFactory(valor=1.0))
+    session.commit()
+    asyncio.run(index.load(session_factory))
+
+    async def scenario():
+        for _ in range(3):
+            index.invalidate(session_factory)
+        stale_page = index.page(list_params())
+        while index.stale:
+            await asyncio.sleep(0.01)
+        return stale_page
+
+    expected_loads = 2
+    assert asyncio.run(scenario()) is None
+    assert index.loads == expected_loads
+    assert index.page(list_params())
+
+
+def test_list_products_uses_index(clientHttp, index, token):
+    response = clientHttp.get(
+        '/products/',
+        params={'sort': '-valor', 'limit': 2},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [product['valor'] for product in response.json()['products']] == [
+        20.0,
+        10.0,
+    ]
+    assert response.json()['next_cursor']
+    assert index.stats()['answered'] == 1
+
+
+def test_writes_update_index(clientHttp, index, token_admin):
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    created = clientHttp.post(
+        '/products/',
+        json={
+            'descricao': 'Novo',
+            'valor': 99.0,
+            'codigo_barras': 'x',
+            'secao': 'alimentacao',
+            'categoria': 'livros',
+            'estoque_inicial': 1,
+        },
+        headers=headers,
+    ).json()
+    clientHttp.delete(
+        f'/products/{index.page(list_params())[0]}', headers=headers
+    )
+
+    response = clientHttp.get(
+        '/products/', params={'sort': '-valor'}, headers=headers
+    )
+
+    expected_products = 5
+    assert response.json()['products'][0]['id'] == created['id']
+    assert len(response.json()['products']) == expected_products
@@ -1,7 +1,24 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
 import os
+import threading
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from fast_zero import bulk, catalog, images
+from fast_zero.database import ThreadedSession
 from fast_zero.factories import ProductFactory
+from fast_zero.models import Product, ProductImage, ProductImageVariant
+from fast_zero.pagination import MAX_PAGE_SIZE
+from fast_zero.routers.products import filter_products, warm_up
 from fast_zero.states import CategoryState
 
 
@@ -28,10 +45,31 @@ def test_create_product(clientHttp, token_admin):
         'categoria': 'roupas',
         'estoque_inicial': 10,
         'data_validade': None,
+        'thumbnail': None,
+    }
+
+
+@pytest.fixture()
+def image_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(images.settings, 'IMAGE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def stored_files(image_dir):
+    return {
+        str(path.relative_to(image_dir))
+        for path in image_dir.rglob('*')
+        if path.is_file()
     }
 
 
-def test_add_images(clientHttp, token_admin, product):
+@pytest.fixture()
+def png():
+    with open(f'{os.getcwd()}/product_images/image.png', 'rb') as file:
+        return file.read()
+
+
+def test_add_images(clientHttp, token_admin, product, image_dir):
     file_path = f'{os.getcwd()}/product_images/image.png'
     file = open(file_path, 'rb')
     response = clientHttp.post(
@@ -41,6 +79,261 @@ def test_add_images(clientHttp, token_admin, product):
     )
     assert response.status_code == HTTPStatus.OK
 
+    [image] = response.json()['product_images']
+    assert image['file_type'] == 'image/png'
+    assert (image_dir / image['file_name']).read_bytes() == open(
+        file_path, 'rb'
+    ).read()
+
+
+def test_add_images_replaces_old_files_after_commit(  # noqa: PLR0913, PLR0917
+    session, clientHttp, token_admin, product, image_dir, png
+):
+    def upload(*contents):
+        return clientHttp.post(
+            f'/products/{product.id}/images',
+            headers={'Authorization': f'Bearer {token_admin}'},
+            files=[
+                ('files', ('a.png', content, 'image/png'))
+                for content in contents
+            ],
+        ).json()['product_images']
+
+    old = upload(png + b'1', png + b'2')
+    new = upload(png)
+
+    assert session.scalars(
+        select(ProductImage.file_name).where(
+            ProductImage.product_id == product.id
+        )
+    ).all() == [new[0]['file_name']]
+    variants = set(session.scalars(select(ProductImageVariant.file_name)))
+    assert stored_files(image_dir) == {new[0]['file_name'], *variants}
+    assert not any((image_dir / image['file_name']).exists() for image in old)
+
+
+@pytest.mark.parametrize(
+    ('outcome', 'expected_kept'), [('commit', True), ('rollback', False)]
+)
+def test_orphan_cleanup_waits_for_upload_reusing_the_blob(  # noqa: PLR0913, PLR0917
+    engine, product, image_dir, png, outcome, expected_kept
+):
+    content_hash = hashlib.sha256(png).hexdigest()
+    file_name = images.blob_name(content_hash, 'png')
+    (image_dir / file_name).parent.mkdir(parents=True)
+    (image_dir / file_name).write_bytes(png)
+
+    @asynccontextmanager
+    async def session_factory():
+        with Session(engine) as cleanup_session:
+            yield ThreadedSession(cleanup_session)
+
+    with Session(engine) as upload:
+        # An upload that found the blob already on disk, not committed.
+        asyncio.run(images.lock_blobs(ThreadedSession(upload), [content_hash]))
+        upload.add(
+            ProductImage(
+                product_id=product.id,
+                file_name=file_name,
+                file_type='image/png',
+                content_hash=content_hash,
+            )
+        )
+        upload.flush()
+
+        cleanup = threading.Thread(
+            target=asyncio.run,
+            args=(
+                images.remove_orphans(
+                    session_factory, [(file_name, content_hash)]
+                ),
+            ),
+        )
+        cleanup.start()
+        cleanup.join(timeout=0.5)
+        assert cleanup.is_alive()
+
+        getattr(upload, outcome)()
+
+    cleanup.join(timeout=5)
+    assert (image_dir / file_name).exists() is expected_kept
+
+
+def test_add_images_stores_content_addressed_and_shared(  # noqa: PLR0913, PLR0917
+    session, clientHttp, token_admin, products, image_dir, png
+):
+    def upload(product, content):
+        return clientHttp.post(
+            f'/products/{product.id}/images',
+            headers={'Authorization': f'Bearer {token_admin}'},
+            files={'files': ('a.png', content, 'image/png')},
+        ).json()['product_images']
+
+    content_hash = hashlib.sha256(png).hexdigest()
+    expected_name = f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.png'
+
+    [first] = upload(products[0], png)
+    [second] = upload(products[1], png)
+
+    assert first['file_name'] == second['file_name'] == expected_name
+    assert {
+        name for name in stored_files(image_dir) if name.endswith('.png')
+    } == {expected_name}
+
+    # The file survives while another product still references it.
+    upload(products[0], png + b'other')
+    assert expected_name in stored_files(image_dir)
+
+    upload(products[1], png + b'other')
+    assert expected_name not in stored_files(image_dir)
+
+
+@pytest.fixture()
+def large_png():
+    image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    image.new('RGB', (1200, 800), 'teal').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_add_images_generates_variants(  # noqa: PLR0913, PLR0917
+    session, clientHttp, token_admin, product, image_dir, large_png
+):
+    clientHttp.post(
+        f'/products/{product.id}/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files={'files': ('a.png', large_png, 'image/png')},
+    )
+
+    variants = {
+        variant.kind: variant
+        for variant in session.scalars(select(ProductImageVariant)).all()
+    }
+    assert set(variants) == {'thumbnail', 'webp'}
+    assert (variants['thumbnail'].width, variants['thumbnail'].height) == (
+        320,
+        213,
+    )
+    assert (variants['webp'].width, variants['webp'].height) == (1200, 800)
+    assert all(
+        (image_dir / variant.file_name).read_bytes().startswith(b'RIFF')
+        for variant in variants.values()
+    )
+
+    response = clientHttp.get(
+        f'/products/{product.id}',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+    assert response.json()['thumbnail'] == variants['thumbnail'].file_name
+
+
+def test_add_images_reuses_variants_of_identical_content(  # noqa: PLR0913, PLR0917
+    session, clientHttp, token_admin, products, image_dir, large_png
+):
+    reused = images.variant_pool.reused
+    for product in products[:2]:
+        clientHttp.post(
+            f'/products/{product.id}/images',
+            headers={'Authorization': f'Bearer {token_admin}'},
+            files={'files': ('a.png', large_png, 'image/png')},
+        )
+
+    thumbnails = session.scalars(
+        select(ProductImageVariant.file_name).where(
+            ProductImageVariant.kind == 'thumbnail'
+        )
+    ).all()
+    assert len(thumbnails) == len(products[:2])
+    assert len(set(thumbnails)) == 1
+    assert images.variant_pool.reused == reused + 1
+
+
+def test_migrate_legacy_images(session, engine, product, image_dir, png):
+    (image_dir / 'legacy.png').write_bytes(png)
+    session.add_all([
+        ProductImage(
+            file_name='legacy.png', file_type='image/png', product_id=product.id
+        ),
+        ProductImage(
+            file_name='gone.png', file_type='image/png', product_id=product.id
+        ),
+    ])
+    session.commit()
+
+    result = images.migrate_legacy_images(engine)
+
+    content_hash = hashlib.sha256(png).hexdigest()
+    expected_name = f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.png'
+    assert result == {'moved': 1, 'missing': 1}
+    assert stored_files(image_dir) == {expected_name}
+    session.expire_all()
+    assert (
+        session.scalar(
+            select(ProductImage).where(
+                ProductImage.content_hash == content_hash
+            )
+        ).file_name
+        == expected_name
+    )
+
+
+def test_add_images_rejects_unsupported_type(
+    clientHttp, token_admin, product, image_dir
+):
+    response = clientHttp.post(
+        f'/products/{product.id}/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files={'files': ('notes.txt', b'hello', 'text/plain')},
+    )
+
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+    assert not stored_files(image_dir)
+
+
+def test_add_images_rejects_mislabelled_content(  # noqa: PLR0913, PLR0917
+    session, clientHttp, token_admin, product, image_dir, png
+):
+    response = clientHttp.post(
+        f'/products/{product.id}/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files=[
+            ('files', ('a.png', png, 'image/png')),
+            ('files', ('b.png', b'not really a png', 'image/png')),
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+    assert response.json() == {
+        'detail': 'File content does not match image/png.'
+    }
+    assert not stored_files(image_dir)
+    assert not session.scalars(select(ProductImage)).all()
+
+
+def test_add_images_rejects_oversized_file(  # noqa: PLR0913, PLR0917
+    clientHttp, token_admin, product, image_dir, png, monkeypatch
+):
+    monkeypatch.setattr(images.settings, 'IMAGE_MAX_BYTES', len(png) - 1)
+
+    response = clientHttp.post(
+        f'/products/{product.id}/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files={'files': ('a.png', png, 'image/png')},
+    )
+
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert not stored_files(image_dir)
+
+
+def test_add_images_product_not_found(clientHttp, token_admin, png):
+    response = clientHttp.post(
+        '/products/999/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files={'files': ('a.png', png, 'image/png')},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
 
 def test_list_products_should_return_5_products(session, clientHttp, token):
     expected_products = 5
@@ -154,6 +447,7 @@ def test_show_client(clientHttp, product, token):
         'categoria': product.categoria,
         'estoque_inicial': product.estoque_inicial,
         'data_validade': product.data_validade,
+        'thumbnail': None,
     }
 
 
@@ -213,6 +507,28 @@ def test_delete_product(session, clientHttp, token_admin):
     }
 
 
+def test_delete_product_removes_its_last_referenced_blobs(
+    session, clientHttp, token_admin, image_dir, png
+):
+    products = ProductFactory.create_batch(2)
+    session.add_all(products)
+    session.commit()
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    for product in products:
+        clientHttp.post(
+            f'/products/{product.id}/images',
+            headers=headers,
+            files={'files': ('a.png', png, 'image/png')},
+        )
+    shared = stored_files(image_dir)
+
+    clientHttp.delete(f'/products/{products[0].id}', headers=headers)
+    assert stored_files(image_dir) == shared
+
+    clientHttp.delete(f'/products/{products[1].id}', headers=headers)
+    assert stored_files(image_dir) == set()
+
+
 def test_delete_product_error(clientHttp, token_admin):
     response = clientHttp.delete(
         f'/products/{10}', headers={'Authorization': f'Bearer {token_admin}'}
@@ -220,3 +536,484 @@ def test_delete_product_error(clientHttp, token_admin):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Product not found.'}
+
+
+def test_list_products_cursor_pagination_should_walk_all_products(
+    session, clientHttp, token
+):
+    expected_products = 5
+    session.bulk_save_objects(ProductFactory.create_batch(5))
+    session.commit()
+
+    seen, cursor = [], None
+    while True:
+        response = clientHttp.get(
+            '/products/',
+            params={'limit': 2, **({'cursor': cursor} if cursor else {})},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        data = response.json()
+        seen += [product['id'] for product in data['products']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == expected_products
+    assert len(set(seen)) == expected_products
+
+
+def test_list_products_invalid_cursor(clientHttp, token):
+    response = clientHttp.get(
+        '/products/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+
+def test_list_products_limit_above_max_page_size(clientHttp, token):
+    response = clientHttp.get(
+        f'/products/?limit={MAX_PAGE_SIZE + 1}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_products_search_orders_by_similarity(session, clientHttp, token):
+    try:
+        with session.begin_nested():
+            session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except DBAPIError:
+        pytest.skip('pg_trgm is not available')
+    session.commit()
+    session.bulk_save_objects([
+        ProductFactory(descricao='Caneta azul escolar'),
+        ProductFactory(descricao='Caneta'),
+        ProductFactory(descricao='Caderno'),
+    ])
+    session.commit()
+
+    response = clientHttp.get(
+        '/products/?search=caneta',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    descricoes = [p['descricao'] for p in response.json()['products']]
+    assert descricoes == ['Caneta', 'Caneta azul escolar']
+
+
+def test_list_products_filter_valor_range_should_return_2_products(
+    session, clientHttp, token
+):
+    expected_products = 2
+    session.bulk_save_objects([
+        ProductFactory(valor=valor) for valor in (5.0, 10.0, 20.0, 40.0)
+    ])
+    session.commit()
+
+    response = clientHttp.get(
+        '/products/?valor_min=10&valor_max=20',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    valores = [p['valor'] for p in response.json()['products']]
+    assert len(valores) == expected_products
+    assert set(valores) == {10.0, 20.0}
+
+
+def test_list_products_sort_by_valor_desc_with_cursor(
+    session, clientHttp, token
+):
+    session.bulk_save_objects([
+        ProductFactory(valor=valor) for valor in (5.0, 40.0, 10.0, 20.0, 10.0)
+    ])
+    session.commit()
+
+    valores, cursor = [], None
+    while True:
+        response = clientHttp.get(
+            '/products/',
+            params={
+                'sort': '-valor',
+                'limit': 2,
+                **({'cursor': cursor} if cursor else {}),
+            },
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        data = response.json()
+        valores += [p['valor'] for p in data['products']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert valores == [40.0, 20.0, 10.0, 10.0, 5.0]
+
+
+def test_list_products_invalid_sort(clientHttp, token):
+    response = clientHttp.get(
+        '/products/?sort=descricao',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_filter_products_price_range_is_index_backed(session):
+    session.execute(text('SET LOCAL enable_seqscan = off'))
+    query = filter_products(
+        select(Product), categoria='books', valor_min=10, valor_max=20
+    )
+    compiled = query.compile(dialect=session.bind.dialect)
+
+    plan = '\n'.join(
+        session.connection()
+        .exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+        .scalars()
+    )
+
+    assert 'ix_products_categoria_valor_id' in plan
+
+
+PRODUCT_PAYLOAD = {
+    'descricao': 'Caneta',
+    'valor': 2.5,
+    'codigo_barras': '7890000000001',
+    'secao': 'papelaria',
+    'categoria': 'livros',
+    'estoque_inicial': 100,
+}
+
+
+def test_create_products_bulk_json(session, clientHttp, token_admin):
+    response = clientHttp.post(
+        '/products/bulk',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        json=[PRODUCT_PAYLOAD, {'descricao': 'sem valor'}, PRODUCT_PAYLOAD],
+    )
+
+    data = response.json()
+    assert response.status_code == HTTPStatus.OK
+    assert [created['row'] for created in data['created']] == [1, 3]
+    assert [error['row'] for error in data['errors']] == [2]
+    assert session.scalar(select(func.count(Product.id))) == len(
+        data['created']
+    )
+
+
+def test_create_products_bulk_ndjson(clientHttp, token_admin):
+    body = '\n'.join([json.dumps(PRODUCT_PAYLOAD), '{not json', ''])
+
+    response = clientHttp.post(
+        '/products/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content=body,
+    )
+
+    data = response.json()
+    assert len(data['created']) == 1
+    assert data['errors'] == [{'row': 2, 'detail': 'Invalid JSON line.'}]
+
+
+def test_create_products_bulk_csv(monkeypatch, clientHttp, token_admin):
+    monkeypatch.setattr(bulk.settings, 'BULK_CHUNK_SIZE', 2)
+    expected_products = 5
+    header = ','.join(PRODUCT_PAYLOAD)
+    line = ','.join(str(value) for value in PRODUCT_PAYLOAD.values())
+    body = '\r\n'.join([header] + [line] * expected_products)
+
+    response = clientHttp.post(
+        '/products/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'text/csv',
+        },
+        content=body,
+    )
+
+    ids = [created['id'] for created in response.json()['created']]
+    assert ids == sorted(ids)
+    assert len(ids) == expected_products
+
+
+def test_create_products_bulk_csv_multiline_field(
+    session, clientHttp, token_admin
+):
+    payload = {**PRODUCT_PAYLOAD, 'descricao': 'Caneta\nazul, "fina"'}
+    body = io.StringIO()
+    writer = csv.writer(body)
+    writer.writerows([payload, payload.values(), PRODUCT_PAYLOAD.values()])
+
+    response = clientHttp.post(
+        '/products/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'text/csv',
+        },
+        content=body.getvalue(),
+    )
+
+    data = response.json()
+    assert data['errors'] == []
+    assert [created['row'] for created in data['created']] == [1, 2]
+    assert session.scalars(
+        select(Product.descricao).order_by(Product.id)
+    ).all() == [payload['descricao'], PRODUCT_PAYLOAD['descricao']]
+
+
+def test_create_products_bulk_unsupported_media_type(clientHttp, token_admin):
+    response = clientHttp.post(
+        '/products/bulk',
+        headers={
+            'Authorization': f'Bearer {token_admin}',
+            'Content-Type': 'application/xml',
+        },
+        content='<products/>',
+    )
+
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+
+def test_list_products_streams_ndjson_sorted_and_limited(
+    session, clientHttp, token
+):
+    session.bulk_save_objects([
+        ProductFactory(valor=valor) for valor in (5.0, 40.0, 10.0, 20.0)
+    ])
+    session.commit()
+
+    response = clientHttp.get(
+        '/products/',
+        params={'sort': '-valor', 'limit': 3},
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/x-ndjson',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    products = [json.loads(line) for line in response.text.splitlines()]
+    assert [product['valor'] for product in products] == [40.0, 20.0, 10.0]
+
+
+@pytest.fixture()
+def stored_image(clientHttp, token_admin, product, image_dir, png):
+    response = clientHttp.post(
+        f'/products/{product.id}/images',
+        headers={'Authorization': f'Bearer {token_admin}'},
+        files={'files': ('a.png', png, 'image/png')},
+    )
+    return response.json()['product_images'][0]
+
+
+def test_show_image(clientHttp, product, stored_image, png):
+    response = clientHttp.get(
+        f'/products/{product.id}/images/{stored_image["id"]}'
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == png
+    assert response.headers['content-type'] == 'image/png'
+    assert response.headers['etag'] == (f'"{hashlib.sha256(png).hexdigest()}"')
+    assert 'immutable' in response.headers['cache-control']
+
+
+def test_show_image_not_modified(clientHttp, product, stored_image):
+    url = f'/products/{product.id}/images/{stored_image["id"]}'
+    etag = clientHttp.get(url).headers['etag']
+
+    response = clientHttp.get(url, headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert not response.content
+
+
+def test_show_image_range(clientHttp, product, stored_image, png):
+    url = f'/products/{product.id}/images/{stored_image["id"]}'
+
+    response = clientHttp.get(url, headers={'Range': 'bytes=-100'})
+
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert response.content == png[-100:]
+    assert response.headers['content-range'] == (
+        f'bytes {len(png) - 100}-{len(png) - 1}/{len(png)}'
+    )
+
+
+def test_show_image_stale_if_range_sends_whole_file(
+    clientHttp, product, stored_image, png
+):
+    response = clientHttp.get(
+        f'/products/{product.id}/images/{stored_image["id"]}',
+        headers={'Range': 'bytes=0-9', 'If-Range': '"something-else"'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == png
+
+
+def test_show_image_variant(clientHttp, product, stored_image):
+    pytest.importorskip('PIL')
+
+    response = clientHttp.get(
+        f'/products/{product.id}/images/{stored_image["id"]}',
+        params={'variant': 'thumbnail'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'image/webp'
+
+
+def test_show_image_of_another_product(clientHttp, products, stored_image):
+    response = clientHttp.get(
+        f'/products/{products[0].id}/images/{stored_image["id"]}'
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Image not found.'}
+
+
+def test_show_product_not_modified(clientHttp, product, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first = clientHttp.get(f'/products/{product.id}', headers=headers)
+
+    response = clientHttp.get(
+        f'/products/{product.id}',
+        headers={**headers, 'If-None-Match': first.headers['etag']},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == first.headers['etag']
+    assert 'last-modified' in response.headers
+    assert not response.content
+
+
+def test_show_product_etag_changes_after_patch(
+    clientHttp, product, token_admin
+):
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    etag = clientHttp.get(f'/products/{product.id}', headers=headers).headers[
+        'etag'
+    ]
+    clientHttp.patch(
+        f'/products/{product.id}',
+        json={
+            'descricao': 'Outro',
+            'valor': 1.0,
+            'codigo_barras': 'x',
+            'secao': 'alimentacao',
+            'categoria': 'roupas',
+            'estoque_inicial': 1,
+        },
+        headers=headers,
+    )
+
+    response = clientHttp.get(
+        f'/products/{product.id}', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
+
+
+def test_list_products_not_modified(session, clientHttp, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(ProductFactory.create_batch(3))
+    session.commit()
+    etag = clientHttp.get('/products/', headers=headers).headers['etag']
+
+    response = clientHttp.get(
+        '/products/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert etag.startswith('W/')
+
+
+def test_list_products_served_from_catalog_cache(session, clientHttp, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(ProductFactory.create_batch(2))
+    session.commit()
+    first = clientHttp.get('/products/', headers=headers)
+
+    session.add(ProductFactory())
+    session.commit()
+    response = clientHttp.get('/products/', headers=headers)
+
+    assert response.json() == first.json()
+    assert response.headers['etag'] == first.headers['etag']
+
+
+def test_catalog_cache_invalidated_by_writes(
+    session, clientHttp, product, token_admin
+):
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    clientHttp.get('/products/', headers=headers)
+    clientHttp.get(f'/products/{product.id}', headers=headers)
+    clientHttp.patch(
+        f'/products/{product.id}',
+        json={
+            'descricao': 'Outro',
+            'valor': 1.0,
+            'codigo_barras': 'x',
+            'secao': 'alimentacao',
+            'categoria': 'roupas',
+            'estoque_inicial': 1,
+        },
+        headers=headers,
+    )
+
+    listed = clientHttp.get('/products/', headers=headers)
+    shown = clientHttp.get(f'/products/{product.id}', headers=headers)
+
+    assert listed.json()['products'][0]['descricao'] == 'Outro'
+    assert shown.json()['descricao'] == 'Outro'
+
+
+def test_catalog_cache_reports_hit_ratio(clientHttp, product, token_admin):
+    headers = {'Authorization': f'Bearer {token_admin}'}
+    for _ in range(2):
+        clientHttp.get(f'/products/{product.id}', headers=headers)
+
+    response = clientHttp.get('/metrics/', headers=headers)
+
+    assert response.json()['catalog_cache'] == {
+        'backend': 'memory',
+        'entries': 1,
+        'maxsize': catalog.settings.CATALOG_CACHE_MAXSIZE,
+        'bytes': response.json()['catalog_cache']['bytes'],
+        'hits': 1,
+        'stale_hits': 0,
+        'misses': 1,
+        'hit_ratio': 0.5,
+        'refreshes': 0,
+        'refresh_failures': 0,
+    }
+
+
+def test_warm_up_primes_first_pages(session, clientHttp, token):
+    session.add_all(
+        ProductFactory.create_batch(2, categoria=CategoryState.books)
+    )
+    session.commit()
+
+    @asynccontextmanager
+    async def session_factory():
+        yield ThreadedSession(session)
+
+    asyncio.run(warm_up(session_factory))
+    response = clientHttp.get(
+        '/products/',
+        params={'categoria': 'books'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    expected_products = 2
+    assert len(response.json()['products']) == expected_products
+    assert catalog.catalog_cache.hits == 1
+    assert catalog.catalog_cache.misses == 0
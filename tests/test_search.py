@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from fast_zero.search import TRIGRAM_INDEXES, ensure_trigram_indexes
+
+
+def test_ensure_trigram_indexes_can_be_rerun(session, engine):
+    try:
+        with session.begin_nested():
+            session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except DBAPIError:
+        pytest.skip('pg_trgm is not available')
+    session.commit()
+
+    ensure_trigram_indexes(engine)
+    ensure_trigram_indexes(engine)
+
+    inspector = inspect(engine)
+    names = {
+        index['name']
+        for table in ('clients', 'products')
+        for index in inspector.get_indexes(table)
+    }
+    assert {name for name, _table, _column in TRIGRAM_INDEXES} <= names
@@ -1,8 +1,21 @@
+import asyncio
 from http import HTTPStatus
+from types import SimpleNamespace
 
+import pytest
 from jwt import decode
+from sqlalchemy import event
 
-from fast_zero.security import create_access_token, settings
+from fast_zero.database import ThreadedSession
+from fast_zero.models import RevokedPrincipal
+from fast_zero.security import (
+    create_access_token,
+    get_current_user,
+    invalidate_principal,
+    principal_cache,
+    revocation_filter,
+    settings,
+)
 
 
 def test_jwt():
@@ -24,3 +37,137 @@ def test_jwt_invalid_token(clientHttp):
 
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+@pytest.mark.skipif(
+    settings.DATABASE_ASYNC,
+    reason='the async driver queries on the event loop without blocking it',
+)
+def test_get_current_user_does_not_query_on_event_loop(
+    clientHttp, engine, token
+):
+    statements_on_loop = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        statements_on_loop.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = clientHttp.post(
+            '/auth/refresh_token',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == HTTPStatus.OK
+    assert statements_on_loop == []
+
+
+@pytest.mark.parametrize(
+    ('stateless', 'expected_hits', 'expected_misses'),
+    [(False, 1, 1), (True, 0, 0)],
+)
+def test_get_current_user_caches_principal(  # noqa: PLR0913, PLR0917
+    monkeypatch, clientHttp, token, stateless, expected_hits, expected_misses
+):
+    # Stateless auth answers from the token claims and skips the cache.
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', stateless)
+
+    for _ in range(2):
+        response = clientHttp.get(
+            '/products/', headers={'Authorization': f'Bearer {token}'}
+        )
+        assert response.status_code == HTTPStatus.OK
+
+    assert principal_cache.stats()['hits'] == expected_hits
+    assert principal_cache.stats()['misses'] == expected_misses
+
+
+def test_get_current_user_skips_caching_a_read_that_spans_a_change(
+    monkeypatch, user, token
+):
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', False)
+
+    async def read_then_change(query):
+        # The user is demoted or deleted while the miss reads it.
+        invalidate_principal(user.email)
+        return user
+
+    principal = asyncio.run(
+        get_current_user(SimpleNamespace(scalar=read_then_change), token)
+    )
+
+    assert principal.id == user.id
+    assert principal_cache.get(user.email) is None
+
+
+def test_delete_user_invalidates_cached_principal(
+    clientHttp, user, token, token_admin
+):
+    clientHttp.post(
+        '/auth/refresh_token', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    response = clientHttp.delete(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    response = clientHttp.post(
+        '/auth/refresh_token', headers={'Authorization': f'Bearer {token}'}
+    )
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_token_carries_role_claims(clientHttp, user, token):
+    decoded = decode(
+        token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+    )
+
+    assert decoded['uid'] == user.id
+    assert decoded['username'] == user.username
+    assert decoded['role'] == user.role
+
+
+def test_stateless_auth_trusts_claims(monkeypatch, clientHttp, token):
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', True)
+
+    response = clientHttp.get(
+        '/products/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert principal_cache.stats()['misses'] == 0
+
+
+def test_stateless_auth_rejects_revoked_user(
+    monkeypatch, clientHttp, user, token, token_admin
+):
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', True)
+
+    response = clientHttp.delete(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token_admin}'},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert user.id in revocation_filter
+
+    response = clientHttp.get(
+        '/products/', headers={'Authorization': f'Bearer {token}'}
+    )
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_revocation_filter_refreshes_from_table(session, clientHttp, user):
+    session.add(RevokedPrincipal(user_id=user.id))
+    session.commit()
+
+    asyncio.run(revocation_filter.refresh(ThreadedSession(session)))
+
+    assert user.id in revocation_filter
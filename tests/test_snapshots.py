@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from fast_zero.factories import OrderFactory, OrderProductFactory
+from fast_zero.models import Order
+from fast_zero.states import OrderState
+
+pq = pytest.importorskip('pyarrow.parquet')
+snapshots = pytest.importorskip('fast_zero.snapshots')
+
+# Negative lag so rows created a moment ago are already eligible.
+LAG = -3600
+
+
+def test_snapshot_partitions_orders_by_month(
+    session, engine, client, product, tmp_path
+):
+    orders = OrderFactory.create_batch(3, client_id=client.id)
+    session.add_all(orders)
+    session.commit()
+    session.bulk_save_objects([
+        OrderProductFactory(order_id=order.id, product_id=product.id)
+        for order in orders
+    ])
+    session.execute(
+        update(Order)
+        .where(Order.id == orders[0].id)
+        .values(created_at=datetime(2024, 1, 15))
+    )
+    session.commit()
+
+    result = snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    assert result['months'] == ['2024-01', f'{orders[-1].created_at:%Y-%m}']
+    assert result['orders'] == len(orders)
+    assert result['order_products'] == len(orders)
+    january = pq.read_table(tmp_path / 'orders' / 'month=2024-01')
+    assert january.column('id').to_pylist() == [orders[0].id]
+    lines = pq.read_table(tmp_path / 'order_products' / 'month=2024-01')
+    assert lines.column('order_id').to_pylist() == [orders[0].id]
+    assert 'order_created_at' not in lines.column_names
+
+
+def test_snapshot_is_incremental(session, engine, client, tmp_path):
+    expected_orders = 3
+    session.add_all(OrderFactory.create_batch(2, client_id=client.id))
+    session.commit()
+    first = snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    assert snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG) == {
+        'updated_at': first['updated_at'],
+        'months': [],
+        'orders': 0,
+        'order_products': 0,
+    }
+
+    session.add(OrderFactory(client_id=client.id))
+    session.commit()
+    second = snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    assert second['updated_at'] > first['updated_at']
+    assert pq.read_table(tmp_path / 'orders').num_rows == expected_orders
+
+
+def test_snapshot_rewrites_the_month_of_an_updated_order(
+    session, engine, client, tmp_path
+):
+    orders = OrderFactory.create_batch(
+        2, client_id=client.id, state=OrderState.waiting
+    )
+    session.add_all(orders)
+    session.commit()
+    snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    session.execute(
+        update(Order)
+        .where(Order.id == orders[0].id)
+        .values(state=OrderState.cancel)
+    )
+    session.commit()
+    result = snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    assert result['orders'] == len(orders)
+    table = pq.read_table(tmp_path / 'orders').to_pylist()
+    assert {row['id']: row['state'] for row in table} == {
+        orders[0].id: OrderState.cancel.value,
+        orders[1].id: OrderState.waiting.value,
+    }
+
+
+def test_snapshot_full_drops_deleted_orders(session, engine, client, tmp_path):
+    orders = OrderFactory.create_batch(2, client_id=client.id)
+    session.add_all(orders)
+    session.commit()
+    snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)
+
+    session.delete(orders[0])
+    session.commit()
+
+    assert (
+        snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG)['months']
+        == []
+    )
+    snapshots.snapshot(engine, str(tmp_path), lag_seconds=LAG, full=True)
+    table = pq.read_table(tmp_path / 'orders')
+    assert table.column('id').to_pylist() == [orders[1].id]
+
+
+def test_snapshot_skips_orders_inside_the_lag(
+    session, engine, client, tmp_path
+):
+    session.add(OrderFactory(client_id=client.id))
+    session.commit()
+
+    result = snapshots.snapshot(engine, str(tmp_path), lag_seconds=3600)
+
+    assert result['orders'] == 0
+    assert not (tmp_path / 'orders').exists()